@@ -3,8 +3,11 @@ import os
 import torch
 import trimesh
 import numpy as np
-from tqdm import tqdm
-from utils import  save_obj,read_VD, winding_number
+from utils import  save_obj,save_txt,read_VD, sample_surface
+from inside_test import occupancy_winding_number, proxy_winding_number, winding_number_chunked
+from adaptive_candidates import adaptive_candidates
+from voronoi_poles import voronoi_poles
+from coverage_solver import save_progressive
 from scipy.optimize import milp, Bounds, LinearConstraint
 from mip import Model, xsum, maximize, BINARY
 
@@ -14,11 +17,16 @@ surface_sample_num = 2000
 dilation = 0.025
 # inner_points = "voronoi"
 inner_points = "random"
+# inner_points = "adaptive"  # candidates concentrated near the medial axis, far fewer than "random"
+surface_sampling = "random"  # or "blue_noise": well spread samples, fewer are needed
+sampling_seed = None
+inside_test = "occupancy"  # or "winding": exact winding numbers of all random candidates
+# inside_test = "proxy"  # winding numbers on a coarse proxy mesh, exact near the surface only
 max_time_SCP = 1000 # in second
 
 
 mesh = trimesh.load('./input/%s.off'%real_name)
-point_set = trimesh.sample.sample_surface(mesh, surface_sample_num)
+point_set = sample_surface(mesh, surface_sample_num, method=surface_sampling, seed=sampling_seed)
 
 mesh_faces = np.array(mesh.faces)
 mesh_vertices = np.array(mesh.vertices)
@@ -27,18 +35,30 @@ point_set = np.array(point_set[0])
 if inner_points == "voronoi":
     medial_path ='_VD.txt'
     inner_point_path  = './input/'+real_name+medial_path
+    if not os.path.exists(inner_point_path):
+        print("Computing Voronoi poles...")
+        inner_points, radius = voronoi_poles(mesh)
+        save_txt(inner_point_path, np.concatenate((inner_points, radius), axis=1))
     inner_points, radius = read_VD(inner_point_path)
     inner_points = np.array(inner_points)
     radius = np.array(radius)
     radius = radius + dilation
 
 else:
-    print("Generating random samples inside the shape...")
-    if os.path.exists("./input/%s_random.obj"%real_name):
+    if inner_points == "adaptive":
+        print("Generating candidates near the medial axis...")
+        if os.path.exists("./input/%s_adaptive.obj"%real_name):
+            inner_points = np.array(trimesh.load("./input/%s_adaptive.obj"%real_name).vertices)
+            print("The number of adaptive inner candidates: ", len(inner_points))
+        else:
+            inner_points = adaptive_candidates(mesh)
+            save_obj("./input/%s_adaptive.obj"%real_name, inner_points)
+    elif os.path.exists("./input/%s_random.obj"%real_name):
         inner_points = trimesh.load("./input/%s_random.obj"%real_name)
         inner_points = np.array(inner_points.vertices)
         print("The number of sampled inner candidates: ", len(inner_points))
     else:
+        print("Generating random samples inside the shape...")
         print("Randomly Generating inner candidates...")
         random_sample_number = 500000
         min_corner = np.amin(np.amin(mesh_vertices, axis=0), axis=0)
@@ -54,14 +74,14 @@ else:
         P_y = (max_y) * np.random.random((random_sample_number, 1)) *1.3+ min_y - 0.1
         P_z = (max_z) * np.random.random((random_sample_number, 1))*1.3 + min_z - 0.1
         P = np.concatenate((P_x, P_y, P_z), axis=1)
-        winding_con = []
-        for i in tqdm(range(0, len(P), 5000)):
-            start = i
-            end = i + 5000
-            winding = winding_number(torch.tensor(P[start:end,:]).cuda().double(), torch.tensor(mesh_vertices).cuda().double(), torch.tensor(mesh_faces).cuda().long())
-            winding_con.append(winding)
-        winding_con = torch.cat(winding_con, dim=0)
-        inner_points = P[winding_con.cpu().numpy() > 0.5]
+        if inside_test == "occupancy":
+            # voxel lookup, exact winding numbers near the surface only
+            inner_points = P[occupancy_winding_number(P, mesh_vertices, mesh_faces) > 0.5]
+        elif inside_test == "proxy":
+            inner_points = P[proxy_winding_number(P, mesh_vertices, mesh_faces) > 0.5]
+        else:
+            # exact winding numbers, the per-face data built once for all the chunks
+            inner_points = P[winding_number_chunked(P, mesh_vertices, mesh_faces) > 0.5]
         save_obj("./input/%s_random.obj"%real_name, inner_points)
     inner_points_g = torch.tensor(inner_points).cuda().double()
     point_set_g = torch.tensor(point_set).cuda().double()
@@ -105,6 +125,9 @@ print(np.sum(res_milp.x))
 value_pos = np.nonzero(res_milp.x)[0]
 print("The number of selected inner points: ", len(value_pos))
 save_obj("./output/mesh_selected_inner_points.obj", inner_points[value_pos])
+radius_ori = radius_g[0].cpu().numpy() - dilation
+save_txt("./output/mesh_selected_inner_points.txt", np.concatenate((inner_points[value_pos], radius_ori[value_pos, None]), axis=1))
+save_progressive("./output/mesh_selected_inner_points_progressive.npz", D, value_pos, inner_points[value_pos], radius_ori[value_pos])
 
 
 
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Medial-ridge-adaptive candidate sampling
+Only candidates near the medial axis get selected, so uniform volume sampling
+wastes most of its candidates. The medial axis is the ridge of the distance to
+the surface: the points with at least two nearly equidistant nearest surface
+points. A candidate p with nearest dense surface sample q is stepped away from
+q by h; if the nearest sample of the stepped point is far from q, the distance
+field stopped growing along the step and p lies within h of the ridge.
+Starting from a coarse set, every round resamples densely around the
+ridge candidates found so far, with a halved step.
+"""
+
+import sys
+import argparse
+
+import numpy as np
+import trimesh
+from scipy.spatial import cKDTree
+
+from utils import save_obj, sample_surface
+from inside_test import occupancy_winding_number
+
+
+def ridge_mask(points, tree, surface_points, step, separation):
+    """Candidates within step of the ridge of the distance to the surface samples"""
+    dist, nearest = tree.query(points, k=1)
+    direction = (points - surface_points[nearest]) / np.maximum(dist, 1e-12)[:, None]
+    _, stepped_nearest = tree.query(points + step * direction, k=1)
+    return np.linalg.norm(surface_points[stepped_nearest] - surface_points[nearest], axis=1) > separation
+
+
+def adaptive_candidates(mesh, coarse_number=10000, rounds=3, round_number=3000, surface_number=20000,
+                        seed=None, device=None):
+    """Inner candidates concentrated near the medial axis of a mesh
+
+    Parameters
+    ----------
+    mesh           : trimesh mesh
+    coarse_number  : candidates of the first round, uniform in the bounding box and shot
+                     inwards from the surface
+    rounds         : refinement rounds, the step is halved at every round
+    round_number   : candidates resampled around the ridge at every round
+    surface_number : dense surface samples approximating the distance field
+    Returns
+    -------
+    (n, 3) inner candidates within the sampling step of the ridge, plus repair
+    candidates near the surface samples no candidate ball touches
+    """
+    rng = np.random.default_rng(seed)
+    mesh_vertices = np.array(mesh.vertices)
+    mesh_faces = np.array(mesh.faces)
+    surface_points, face_index = sample_surface(mesh, surface_number, seed=seed)
+    surface_points = np.array(surface_points)
+    surface_normals = np.array(mesh.face_normals)[face_index]
+    tree = cKDTree(surface_points)
+    # mean spacing of the surface samples: samples closer than a few spacings
+    # belong to the same foot point on the surface
+    spacing = np.sqrt(mesh.area / surface_number)
+    separation = 2 * spacing
+    min_corner = np.min(mesh_vertices, axis=0)
+    max_corner = np.max(mesh_vertices, axis=0)
+    step = max(np.max(max_corner - min_corner) / 32, spacing)
+
+    def inside(points):
+        return points[occupancy_winding_number(points, mesh_vertices, mesh_faces, device=device) > 0.5]
+
+    # coarse set: half uniform in the bounding box, half shot inwards from the
+    # surface so that thin parts get candidates too
+    shot = rng.integers(surface_number, size=coarse_number - coarse_number // 2)
+    depth = rng.uniform(0, 4 * step, size=(len(shot), 1))
+    points = np.concatenate((rng.uniform(min_corner, max_corner, size=(coarse_number // 2, 3)),
+                             surface_points[shot] - depth * surface_normals[shot]), axis=0)
+    points = inside(points)
+    ridge = points[ridge_mask(points, tree, surface_points, step, separation)]
+    print("Round 0: %d inner candidates, %d near the ridge (step %f)" % (len(points), len(ridge), step))
+    candidates = [ridge]
+    for r in range(1, rounds + 1):
+        if len(ridge) == 0:
+            break
+        step = max(step / 2, spacing)
+        parents = ridge[rng.integers(len(ridge), size=round_number)]
+        points = inside(parents + rng.normal(scale=step, size=parents.shape))
+        ridge = points[ridge_mask(points, tree, surface_points, step, separation)]
+        print("Round %d: %d inner candidates, %d near the ridge (step %f)" % (r, len(points), len(ridge), step))
+        candidates.append(ridge)
+    candidates = np.concatenate(candidates, axis=0)
+
+    # repair: near convex tips the ridge meets the surface and is missed, so
+    # surface samples touched by no candidate ball get a candidate shot inwards
+    radius = tree.query(candidates, k=1)[0]
+    touched = np.zeros(surface_number, dtype=bool)
+    for nb in tree.query_ball_point(candidates, radius + spacing, return_sorted=False):
+        touched[nb] = True
+    untouched = np.nonzero(~touched)[0]
+    if len(untouched) > 0:
+        depth = rng.uniform(0, 2 * spacing, size=(len(untouched), 1))
+        repair = inside(surface_points[untouched] - depth * surface_normals[untouched])
+        print("Repair: %d untouched surface samples, %d candidates added" % (len(untouched), len(repair)))
+        candidates = np.concatenate((candidates, repair), axis=0)
+    print("The number of adaptive inner candidates: ", len(candidates))
+    return candidates
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Inner candidates sampled adaptively near the medial axis')
+    parser.add_argument('--mesh', required=True, help='Input mesh file path (.off)')
+    parser.add_argument('--output', required=True, help='Output candidates (.obj), e.g. ./input/<name>_adaptive.obj')
+    parser.add_argument('--coarse', type=int, default=10000, help='Candidates of the first round (default: 10000)')
+    parser.add_argument('--rounds', type=int, default=3, help='Refinement rounds (default: 3)')
+    parser.add_argument('--round-number', type=int, default=3000,
+                        help='Candidates resampled per round (default: 3000)')
+    parser.add_argument('--surface-samples', type=int, default=20000,
+                        help='Dense surface samples approximating the distance field (default: 20000)')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed')
+    args = parser.parse_args()
+
+    mesh = trimesh.load(args.mesh)
+    candidates = adaptive_candidates(mesh, args.coarse, args.rounds, args.round_number, args.surface_samples,
+                                     seed=args.seed)
+    save_obj(args.output, candidates)
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
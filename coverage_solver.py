@@ -0,0 +1,543 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Solvers of the Coverage Axis set cover problem
+D is the coverage matrix (surface samples x candidates, dense or scipy sparse),
+D[i, j] != 0 if the dilated sphere of candidate j covers sample i.
+"""
+
+import os
+import json
+import hashlib
+import time
+import heapq
+
+import numpy as np
+import scipy.sparse as sp
+from tqdm import tqdm
+from scipy.optimize import milp, Bounds, LinearConstraint
+
+
+def heuristic_alg(D, candidate, radius_list, reg_radius=1, reg=1, max_iter=1000, penalty='stand', warm_start=None,
+                  batch_size=1, progress=True):
+    """Heuristic algorithm for solving coverage problem
+
+    D may be a dense array or a scipy sparse matrix. warm_start is an optional
+    sequence of candidate indices (e.g. a previous solution) that are selected
+    first, skipping those that do not cover any new sample. With batch_size > 1,
+    every pass selects up to batch_size high-score candidates whose coverage of
+    the uncovered samples is disjoint (see select_disjoint_batch).
+    max_iter is the maximum number of selected points. progress=False hides the
+    progress bar (e.g. in worker processes). The selection stops when no
+    candidate covers any of the uncovered samples.
+    """
+    m, n = D.shape
+    S = np.arange(m)
+    A = []
+    grade = []
+    if warm_start is not None:
+        S = apply_warm_start(D, S, A, grade, warm_start)
+    pbar = tqdm(range(max(max_iter - len(A), 0)), disable=not progress)
+    for i in pbar:
+        if len(S) == 0:
+            break
+        picks, scores, S = heuristic_step(D, S, A, candidate, radius_list, reg_radius, reg, penalty,
+                                          batch_size, max_iter - len(A))
+        if len(picks) == 0:
+            break
+        A.extend(picks)
+        grade.extend(scores)
+        pbar.set_description(f'Coverage rate: {1 - len(S) / m:.4f}')
+        if len(A) >= max_iter:
+            break
+    coverage_rate = len(S) / m
+    A = np.array(A, dtype=int)
+    return A, grade, coverage_rate
+
+
+def heuristic_step(D, S, A, candidate, radius_list, reg_radius=1, reg=1, penalty='stand', batch_size=1,
+                   max_new=1):
+    """One pass of the heuristic algorithm
+
+    S are the uncovered samples and A the selected candidates so far.
+    Returns the newly selected candidates, their scores and the remaining uncovered samples.
+    No candidate is selected when none covers any of the uncovered samples.
+    """
+    score = coverage_count(D, S).astype(float)  # summarize each col of subarray D[S]
+    if not np.any(score):
+        # the uncovered samples are out of reach of every candidate (standardized scores would be NaN)
+        return [], [], S
+    score = (score - np.mean(score)) / np.std(score, ddof=1)
+    if len(A) > 0:
+        loss = compute_min_distances(candidate, candidate[A])
+        loss = (loss - np.mean(loss)) / np.std(loss, ddof=1)
+        score += reg * loss
+    if penalty == 'stand':
+        loss_radius = 1 / radius_list
+        loss_radius = (loss_radius - np.mean(loss_radius)) / np.std(loss_radius, ddof=1)
+    else:
+        radius_max = np.max(radius_list)
+        loss_radius = 0.1 * radius_max / radius_list
+    score -= reg_radius * loss_radius
+    if batch_size > 1:
+        picks, covered = select_disjoint_batch(D, S, score, min(batch_size, max_new))
+        return picks, list(score[picks]), S[~covered]
+    i_k = np.argmax(score)
+    return [i_k], [score[i_k]], S[coverage_column(D, S, i_k) == 0]
+
+
+def apply_warm_start(D, S, A, grade, warm_start):
+    """Select the warm start candidates covering new samples (in place on A and grade), returns the uncovered samples"""
+    for i_k in warm_start:
+        if len(S) == 0:
+            break
+        covered = coverage_column(D, S, i_k) != 0
+        if np.any(covered):
+            A.append(i_k)
+            grade.append(np.nan)
+            S = S[~covered]
+    return S
+
+
+# Memory-mapped coverage matrices (see out_of_core.py) are read by tiles of columns
+OUT_OF_CORE_TILE = 16384
+
+
+def coverage_count(D, rows):
+    """Number of the given samples (rows) covered by each candidate (column)"""
+    if isinstance(D, np.memmap):
+        count = np.empty(D.shape[1], dtype=np.int64)
+        for start in range(0, D.shape[1], OUT_OF_CORE_TILE):
+            end = min(start + OUT_OF_CORE_TILE, D.shape[1])
+            count[start:end] = D[rows, start:end].sum(axis=0)
+        return count
+    return np.asarray(D[rows].sum(axis=0)).reshape(-1)
+
+
+def coverage_column(D, rows, col):
+    """Coverage of the given samples (rows) by one candidate, as a dense vector"""
+    if sp.issparse(D):
+        return D[rows][:, col].toarray().reshape(-1)
+    return D[rows, col]
+
+
+def select_disjoint_batch(D, S, score, batch_size, scan_factor=8):
+    """Select up to batch_size high-score candidates with disjoint coverage of the uncovered samples S
+
+    The best candidate is always selected; the next ones are taken in decreasing
+    score order among the batch_size * scan_factor best candidates, skipping any
+    candidate covering an uncovered sample already covered by this batch.
+    Returns the selected candidates and the mask of the samples of S they cover.
+    """
+    if isinstance(D, np.memmap):
+        # never load D[S] as a whole, read single columns
+        D_S, rows = D, S
+    else:
+        D_S, rows = D[S], slice(None)
+        if sp.issparse(D_S):
+            D_S = D_S.tocsc()
+
+    def column(j):
+        if sp.issparse(D_S):
+            return D_S[:, j].toarray().reshape(-1) != 0
+        return D_S[rows, j] != 0
+
+    i_k = np.argmax(score)
+    picks = [i_k]
+    covered = column(i_k)
+    if batch_size > 1:
+        count = coverage_count(D_S, rows)
+        for j in np.argsort(-score, kind='stable')[:batch_size * scan_factor]:
+            if len(picks) >= batch_size:
+                break
+            if j == i_k or count[j] == 0:
+                continue
+            col = column(j)
+            if not np.any(covered & col):
+                picks.append(j)
+                covered |= col
+    return picks, covered
+
+
+def compare_batch_selection(D, candidate, radius_list, batch_size, **kwargs):
+    """Quality and runtime delta of batched selection against the one-at-a-time greedy"""
+    report = {}
+    for name, k in (("greedy", 1), ("batch", batch_size)):
+        start = time.time()
+        A, grade, coverage_rate = heuristic_alg(D, candidate, radius_list, batch_size=k, **kwargs)
+        report[name] = {"num_spheres": len(A), "coverage": 1 - coverage_rate, "time": time.time() - start}
+    report["delta_spheres"] = report["batch"]["num_spheres"] - report["greedy"]["num_spheres"]
+    report["delta_coverage"] = report["batch"]["coverage"] - report["greedy"]["coverage"]
+    print(f"Greedy: {report['greedy']['num_spheres']} spheres, coverage {100 * report['greedy']['coverage']:.2f}%, "
+          f"{report['greedy']['time']:.2f}s")
+    print(f"Batch (k={batch_size}): {report['batch']['num_spheres']} spheres, "
+          f"coverage {100 * report['batch']['coverage']:.2f}%, {report['batch']['time']:.2f}s")
+    print(f"Delta: {report['delta_spheres']:+d} spheres, {100 * report['delta_coverage']:+.2f}% coverage")
+    return report
+
+
+def compute_min_distances(X, selected_pts, max_elements=1 << 24):
+    """Compute minimum distances
+
+    Computed by chunks of rows of X, so that the (chunk, n_selected, 3) difference
+    array stays below max_elements whatever the number of candidates.
+    """
+    chunk = max(1, max_elements // (3 * max(len(selected_pts), 1)))
+    min_distances = np.empty(len(X))
+    for start in range(0, len(X), chunk):
+        distances = np.linalg.norm(np.asarray(X[start:start + chunk])[:, np.newaxis] - selected_pts, axis=2)
+        min_distances[start:start + chunk] = np.min(distances, axis=1)
+    return min_distances
+
+
+def solve_milp(D, time_limit=100):
+    """Solve the set cover problem with scipy milp
+
+    Samples that no candidate covers are left out of the constraints, so that
+    the problem stays feasible. Returns the selected candidates.
+    """
+    m, n = D.shape
+    coverable = np.asarray(D.sum(axis=1)).reshape(-1) > 0
+    A = D[coverable] if not sp.issparse(D) else D.tocsr()[coverable]
+    c = np.ones(n)
+    options = {"disp": False, "time_limit": time_limit, }
+    variable_bounds = Bounds(np.zeros(n), np.ones(n))
+    constraints = LinearConstraint(A, lb=np.ones(A.shape[0]))
+    res_milp = milp(c, integrality=np.ones(n), bounds=variable_bounds, constraints=constraints, options=options)
+    if res_milp.x is None:
+        return np.zeros(0, dtype=int)
+    return np.nonzero(np.round(res_milp.x))[0]
+
+
+def coverage_index(D):
+    """Sparse coverage index of D: CSC (candidate -> samples) and CSR (sample -> candidates) boolean matrices"""
+    if sp.issparse(D):
+        csc = sp.csc_matrix(D, dtype=bool)
+    elif isinstance(D, np.memmap):
+        csc = sp.hstack([sp.csc_matrix(np.asarray(D[:, start:start + OUT_OF_CORE_TILE]) != 0)
+                         for start in range(0, D.shape[1], OUT_OF_CORE_TILE)], format='csc')
+    else:
+        csc = sp.csc_matrix(np.asarray(D) != 0)
+    csc.eliminate_zeros()
+    return csc, csc.tocsr()
+
+
+def local_search(D, selected, max_passes=10):
+    """Remove redundant spheres of a cover and replace pairs of spheres by one
+
+    Keeps the number of selected spheres covering every sample. A sphere whose
+    samples are all covered at least twice is removed. A 1-for-2 swap adds an
+    unselected candidate covering all the samples only covered by a selected
+    sphere a (found from one of these samples) and by another selected sphere b
+    (found from the samples of the candidate), then removes a and b. Every move
+    costs O(column size). No covered sample is ever uncovered, but a swap can
+    cover new samples when the cover is partial.
+    Returns the improved selection without duplicates (the kept spheres in
+    their order, then the swapped in ones).
+    """
+    csc, csr = coverage_index(D)
+    m, n = csc.shape
+    col_ptr, col_rows = csc.indptr, csc.indices
+    row_ptr, row_cols = csr.indptr, csr.indices
+
+    def rows(j):
+        return col_rows[col_ptr[j]:col_ptr[j + 1]]
+
+    is_selected = np.zeros(n, dtype=bool)
+    order = []
+    for j in selected:
+        if not is_selected[j]:
+            is_selected[j] = True
+            order.append(int(j))
+    n_start = len(order)
+    count = np.zeros(m, dtype=np.int64)
+    # with count[i] == 1, owner[i] is the only selected candidate covering sample i
+    owner = np.zeros(m, dtype=np.int64)
+    for j in order:
+        count[rows(j)] += 1
+        owner[rows(j)] += j
+
+    def add(j):
+        is_selected[j] = True
+        count[rows(j)] += 1
+        owner[rows(j)] += j
+
+    def remove(j):
+        is_selected[j] = False
+        count[rows(j)] -= 1
+        owner[rows(j)] -= j
+
+    in_c = np.zeros(m, dtype=bool)  # scratch mask, reset after every use
+
+    def redundant(j):
+        return np.all(count[rows(j)] >= 2)
+
+    def try_swap(a):
+        unique = rows(a)[count[rows(a)] == 1]
+        if len(unique) == 0:
+            return None
+        # the candidates covering a's least covered unique sample
+        s = unique[np.argmin(row_ptr[unique + 1] - row_ptr[unique])]
+        for c in row_cols[row_ptr[s]:row_ptr[s + 1]]:
+            if is_selected[c]:
+                continue
+            c_rows = rows(c)
+            in_c[c_rows] = True
+            covers_unique = np.all(in_c[unique])
+            in_c[c_rows] = False
+            if not covers_unique:
+                continue
+            # selected spheres whose unique samples are all covered by c
+            single = c_rows[count[c_rows] == 1]
+            owners, hits = np.unique(owner[single], return_counts=True)
+            for b, hit in zip(owners, hits):
+                if b == a or hit != np.count_nonzero(count[rows(b)] == 1):
+                    continue
+                add(c)
+                remove(a)
+                if redundant(b):
+                    remove(b)
+                    return c, b
+                add(a)
+                remove(c)
+        return None
+
+    removed = swapped = 0
+    for _ in range(max_passes):
+        improved = False
+        for j in order:
+            if is_selected[j] and redundant(j):
+                remove(j)
+                removed += 1
+                improved = True
+        for a in list(order):
+            if not is_selected[a]:
+                continue
+            swap = try_swap(a)
+            if swap is not None:
+                # a candidate removed earlier in this pass is still in order
+                if swap[0] not in order:
+                    order.append(int(swap[0]))
+                swapped += 1
+                improved = True
+        order = [j for j in order if is_selected[j]]
+        if not improved:
+            break
+    print(f"Local search: {removed} redundant spheres removed, {swapped} 1-for-2 swaps, "
+          f"{n_start} -> {len(order)} spheres")
+    return np.array(order, dtype=int)
+
+
+def covered_rate(D, selected):
+    """Fraction of the samples covered by the selected candidates"""
+    if len(selected) == 0:
+        return 0.0
+    return float(np.mean(np.asarray(D[:, selected].sum(axis=1)).reshape(-1) > 0))
+
+
+# Anytime solver interface
+# The greedy is run pass by pass, yielding every improved solution, and stops at
+# whichever comes first of the target coverage rate, the wall-clock budget and
+# the sphere-count cap. Its state (selected candidates, uncovered samples) is
+# checkpointed to disk, so an interrupted run continues where it stopped.
+
+def coverage_fingerprint(D):
+    """Cheap fingerprint of a coverage matrix, from its row and column sums"""
+    h = hashlib.sha1()
+    h.update(np.array(D.shape, dtype=np.int64).tobytes())
+    h.update(np.asarray(D.sum(axis=0), dtype=np.int64).tobytes())
+    h.update(np.asarray(D.sum(axis=1), dtype=np.int64).tobytes())
+    return h.hexdigest()
+
+
+def save_checkpoint(path, D, params, A, grade, S, elapsed):
+    """Save the solver state (written to a temporary file first, so a checkpoint is never half-written)"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, selected=np.array(A, dtype=int), grade=np.array(grade, dtype=float), uncovered=S,
+                 elapsed=elapsed, coverage=coverage_fingerprint(D), params=json.dumps(params, sort_keys=True))
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path, D, params):
+    """Load the solver state of a checkpoint, or None if it does not match the problem"""
+    if path is None or not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        if str(data["coverage"]) != coverage_fingerprint(D) or str(data["params"]) != json.dumps(params, sort_keys=True):
+            print(f"Checkpoint {path} does not match the current problem, ignored")
+            return None
+        return list(data["selected"]), list(data["grade"]), data["uncovered"], float(data["elapsed"])
+
+
+def iter_solutions(D, candidate, radius_list, target_coverage=1.0, time_budget=None, max_spheres=1000,
+                   reg_radius=1, reg=1, penalty='stand', batch_size=1, warm_start=None,
+                   checkpoint=None, checkpoint_interval=10.0):
+    """Generator of the improving solutions of the heuristic algorithm
+
+    Yields dicts with the selected candidates, the coverage rate, the number of
+    spheres and the elapsed time, after every pass. Stops when the coverage
+    reaches target_coverage, after time_budget seconds (including the time
+    spent before a resumed checkpoint), when max_spheres are selected, or when
+    no candidate covers any of the uncovered samples. A resumed checkpoint
+    with more than max_spheres spheres is cut to its first max_spheres.
+    """
+    m, n = D.shape
+    params = {"reg_radius": reg_radius, "reg": reg, "penalty": penalty, "batch_size": batch_size}
+    state = load_checkpoint(checkpoint, D, params)
+    if state is not None:
+        A, grade, S, elapsed_before = state
+        if len(A) > max_spheres:
+            # checkpoint of a run with a larger sphere cap: keep its first spheres only
+            A, grade = A[:max_spheres], grade[:max_spheres]
+            S = np.arange(m)
+            for i_k in A:
+                S = S[coverage_column(D, S, i_k) == 0]
+        print(f"Resumed from checkpoint {checkpoint}: {len(A)} spheres, coverage {1 - len(S) / m:.4f}")
+    else:
+        A, grade, S, elapsed_before = [], [], np.arange(m), 0.0
+        if warm_start is not None:
+            S = apply_warm_start(D, S, A, grade, warm_start)
+    start = time.time()
+    last_checkpoint = start
+
+    def solution():
+        return {
+            "selected": np.array(A, dtype=int),
+            "grade": list(grade),
+            "coverage": 1 - len(S) / m,
+            "num_spheres": len(A),
+            "elapsed": elapsed_before + time.time() - start,
+            "solver": "heuristic",
+        }
+
+    if len(A) > 0:
+        yield solution()
+    pbar = tqdm(total=max_spheres, initial=len(A))
+    while len(S) > 0 and 1 - len(S) / m < target_coverage and len(A) < max_spheres:
+        if time_budget is not None and elapsed_before + time.time() - start >= time_budget:
+            print(f"Time budget of {time_budget}s reached")
+            break
+        picks, scores, S = heuristic_step(D, S, A, candidate, radius_list, reg_radius, reg, penalty,
+                                          batch_size, max_spheres - len(A))
+        if len(picks) == 0:
+            print(f"No candidate covers the {len(S)} uncovered samples")
+            break
+        A.extend(picks)
+        grade.extend(scores)
+        pbar.update(len(picks))
+        pbar.set_description(f'Coverage rate: {1 - len(S) / m:.4f}')
+        if checkpoint is not None and time.time() - last_checkpoint >= checkpoint_interval:
+            save_checkpoint(checkpoint, D, params, A, grade, S, elapsed_before + time.time() - start)
+            last_checkpoint = time.time()
+        yield solution()
+    pbar.close()
+    if checkpoint is not None:
+        save_checkpoint(checkpoint, D, params, A, grade, S, elapsed_before + time.time() - start)
+
+
+def solve_coverage(D, candidate, radius_list, solver='heuristic', target_coverage=1.0, time_budget=None,
+                   max_spheres=1000, callback=None, checkpoint=None, **kwargs):
+    """Common anytime interface of the coverage solvers
+
+    solver : 'heuristic', or 'milp' which first runs the heuristic algorithm to
+             have a solution early, then scipy milp in the remaining time budget
+             (milp only applies to a full coverage target)
+    callback(solution) is called for every improved solution (see iter_solutions).
+    Returns the best solution found.
+    """
+    best = None
+    for solution in iter_solutions(D, candidate, radius_list, target_coverage=target_coverage,
+                                   time_budget=time_budget, max_spheres=max_spheres,
+                                   checkpoint=checkpoint, **kwargs):
+        best = solution
+        if callback is not None:
+            callback(solution)
+    if best is None:
+        best = {"selected": np.zeros(0, dtype=int), "grade": [], "coverage": 0.0, "num_spheres": 0,
+                "elapsed": 0.0, "solver": "heuristic"}
+
+    if solver == 'milp' and target_coverage >= 1:
+        remaining = None if time_budget is None else time_budget - best["elapsed"]
+        if remaining is None or remaining > 0:
+            start = time.time()
+            value_pos = solve_milp(D, np.inf if remaining is None else remaining)
+            if len(value_pos) > 0:
+                coverage = covered_rate(D, value_pos)
+                better = coverage > best["coverage"] or (coverage == best["coverage"]
+                                                         and len(value_pos) < best["num_spheres"])
+                if better and len(value_pos) <= max_spheres:
+                    best = {"selected": value_pos, "grade": [], "coverage": coverage,
+                            "num_spheres": len(value_pos), "elapsed": best["elapsed"] + time.time() - start,
+                            "solver": "milp"}
+                    if callback is not None:
+                        callback(best)
+    return best
+
+
+# Progressive sphere sets
+# The selected spheres are ordered by importance (greedy by the samples each one
+# newly covers), with the coverage rate of every prefix, so the best spheres for
+# any budget are a prefix of the ordering instead of a new solve.
+
+def importance_order(D, selected):
+    """Importance ordering of the selected candidates and the coverage rate of every prefix
+
+    Lazy greedy: the number of samples a sphere newly covers only decreases as
+    spheres are added, so a stale heap entry is an upper bound.
+    Returns the positions in selected, best first, and the cumulative coverage.
+    """
+    selected = np.asarray(selected, dtype=int)
+    m = D.shape[0]
+    csc = coverage_index(D[:, selected])[0]
+    col_ptr, col_rows = csc.indptr, csc.indices
+    covered = np.zeros(m, dtype=bool)
+    heap = [(-(col_ptr[k + 1] - col_ptr[k]), k) for k in range(len(selected))]
+    heapq.heapify(heap)
+    order, coverage = [], []
+    total = 0
+    while heap:
+        _, k = heapq.heappop(heap)
+        rows = col_rows[col_ptr[k]:col_ptr[k + 1]]
+        gain = np.count_nonzero(~covered[rows])
+        if heap and gain < -heap[0][0]:
+            heapq.heappush(heap, (-gain, k))
+            continue
+        covered[rows] = True
+        total += gain
+        order.append(k)
+        coverage.append(total / m)
+    return np.array(order, dtype=int), np.array(coverage)
+
+
+def write_progressive(path, centers, radius, order, coverage):
+    """Write spheres (centers (n, 3), radius (n,)) in an importance order with its prefix coverage
+
+    The .npz holds the spheres (x y z r, float32) best first, the coverage rate
+    after every prefix and the row of every sphere in the unordered selection.
+    """
+    spheres = np.concatenate((np.asarray(centers).reshape(-1, 3), np.reshape(radius, (-1, 1))), axis=1)
+    np.savez(path, spheres=spheres[order].astype(np.float32), coverage=np.asarray(coverage, dtype=np.float32),
+             index=np.asarray(order, dtype=np.int32))
+
+
+def save_progressive(path, D, selected, centers, radius):
+    """Save the selected spheres (centers (n, 3), radius (n,) of selected) in importance order (see write_progressive)"""
+    order, coverage = importance_order(D, selected)
+    write_progressive(path, centers, radius, order, coverage)
+    return order, coverage
+
+
+def load_progressive(path, budget=None, target_coverage=None):
+    """Best spheres (x y z r) of a progressive file and their cumulative coverage
+
+    budget is the number of spheres; target_coverage gives the smallest prefix
+    reaching it (all the spheres if none does).
+    """
+    with np.load(path) as data:
+        spheres, coverage = data["spheres"], data["coverage"]
+    if target_coverage is not None:
+        reached = np.nonzero(coverage >= target_coverage)[0]
+        count = reached[0] + 1 if len(reached) > 0 else len(spheres)
+        budget = count if budget is None else min(budget, count)
+    return spheres[:budget], coverage[:budget]
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dilation sweep for Coverage Axis
+The coverage matrix is the only quantity depending on the dilation, through
+radius + dilation > dist. The candidate-to-sample distances are computed once,
+keeping only the pairs within the largest dilation, and stored sorted by their
+slack (dist - radius): the coverage matrix of any dilation d is then the prefix
+of pairs with slack < d. Solutions are computed from the largest dilation to the
+smallest one, each warm-started from the previous solution.
+"""
+
+import os
+import sys
+import argparse
+
+import numpy as np
+import scipy.sparse as sp
+import trimesh
+from scipy.spatial import cKDTree
+
+from utils import save_obj, save_txt, read_VD, sample_surface
+from coverage_solver import heuristic_alg, solve_milp, local_search, importance_order, write_progressive
+
+
+def build_sorted_coverage(point_set, inner_points, radius, max_dilation, chunk_size=10000):
+    """Sparse candidate-to-sample pairs within the largest dilation, sorted by slack
+
+    Parameters
+    ----------
+    point_set    : (m, 3) surface samples to be covered
+    inner_points : (n, 3) candidate inner points
+    radius       : (n,) or (n, 1) candidate radii, without dilation
+    max_dilation : largest dilation of the sweep
+    Returns
+    -------
+    dict with the row (sample) and column (candidate) indices and the slack of
+    every pair, sorted by increasing slack, and the shape (m, n) of the matrix.
+    """
+    radius = np.reshape(radius, -1)
+    tree = cKDTree(point_set)
+    rows, cols, slack = [], [], []
+    for start in range(0, len(inner_points), chunk_size):
+        end = min(start + chunk_size, len(inner_points))
+        neighbors = tree.query_ball_point(inner_points[start:end], radius[start:end] + max_dilation,
+                                          return_sorted=False)
+        counts = np.array([len(nb) for nb in neighbors], dtype=np.int64)
+        if counts.sum() == 0:
+            continue
+        chunk_cols = np.repeat(np.arange(start, end), counts)
+        chunk_rows = np.concatenate([np.asarray(nb, dtype=np.int64) for nb in neighbors if len(nb) > 0])
+        dist = np.linalg.norm(point_set[chunk_rows] - inner_points[chunk_cols], axis=1)
+        rows.append(chunk_rows)
+        cols.append(chunk_cols)
+        slack.append(dist - radius[chunk_cols])
+    if rows:
+        rows, cols, slack = np.concatenate(rows), np.concatenate(cols), np.concatenate(slack)
+    else:
+        rows, cols, slack = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    order = np.argsort(slack, kind='stable')
+    return {
+        "rows": rows[order],
+        "cols": cols[order],
+        "slack": slack[order],
+        "shape": (len(point_set), len(inner_points)),
+    }
+
+
+def coverage_matrix_at(sorted_coverage, dilation):
+    """Sparse (CSR) coverage matrix of a dilation, the prefix of pairs with slack < dilation"""
+    k = np.searchsorted(sorted_coverage["slack"], dilation, side='left')
+    data = np.ones(k, dtype=np.int8)
+    return sp.csr_matrix((data, (sorted_coverage["rows"][:k], sorted_coverage["cols"][:k])),
+                         shape=sorted_coverage["shape"])
+
+
+def dilation_sweep(point_set, inner_points, radius, dilations, solver='heuristic',
+                   max_iter=1000, reg_radius=1, reg=1, penalty='', time_limit=100, post_optimize=True):
+    """Solve the coverage problem for a list of dilations in one pass
+
+    With post_optimize, redundant spheres of every solution are removed by local
+    search: a solution warm-started from a larger dilation keeps spheres a cold
+    solve would not pick, and has a few percent more spheres without it.
+    Returns a list of dicts (sorted by increasing dilation) with the dilation,
+    the selected candidate indices (without duplicates), the number of spheres,
+    the coverage rate, the fraction of the samples no candidate covers, and the
+    importance order of the selection with its prefix coverage (see importance_order).
+    """
+    radius_list = np.reshape(radius, -1)
+    dilations = sorted(dilations)
+    sorted_coverage = build_sorted_coverage(point_set, inner_points, radius_list, dilations[-1])
+    print(f"Sparse coverage pairs within dilation {dilations[-1]}: {len(sorted_coverage['slack'])} "
+          f"({len(sorted_coverage['slack']) / max(np.prod(sorted_coverage['shape']), 1):.4%} of the dense matrix)")
+
+    curve = []
+    previous = None
+    # From the largest dilation down: the previous (larger) spheres cover most of
+    # the samples, and the greedy only has to fill the remaining holes.
+    for dilation in reversed(dilations):
+        D = coverage_matrix_at(sorted_coverage, dilation)
+        if solver == 'milp':
+            value_pos = solve_milp(D, time_limit)
+        else:
+            value_pos, _, _ = heuristic_alg(D, inner_points, radius_list, reg_radius=reg_radius, reg=reg,
+                                            max_iter=max_iter, penalty=penalty, warm_start=previous)
+        # duplicates removed, keeping the selection order
+        value_pos = np.asarray(value_pos, dtype=int)
+        value_pos = value_pos[np.sort(np.unique(value_pos, return_index=True)[1])]
+        if post_optimize:
+            value_pos = local_search(D, value_pos)
+        coverable = np.diff(D.indptr) > 0
+        covered = np.asarray(D[:, value_pos].sum(axis=1)).reshape(-1) > 0
+        coverage_rate = np.mean(covered) if len(covered) > 0 else 1.0
+        uncoverable = 1 - np.mean(coverable) if len(coverable) > 0 else 0.0
+        order, prefix_coverage = importance_order(D, value_pos)
+        print(f"Dilation {dilation}: {len(value_pos)} spheres, coverage rate {100 * coverage_rate:.2f}% "
+              f"({100 * uncoverable:.2f}% of the samples uncoverable)")
+        curve.append({
+            "dilation": dilation,
+            "selected": value_pos,
+            "num_spheres": len(value_pos),
+            "coverage_rate": coverage_rate,
+            "uncoverable": uncoverable,
+            "order": order,
+            "prefix_coverage": prefix_coverage,
+        })
+        previous = value_pos
+    curve.reverse()
+    return curve
+
+
+def save_sweep_curve(path, curve):
+    """Save the sphere count versus dilation curve (dilation num_spheres coverage_rate uncoverable)"""
+    with open(path, 'w') as f:
+        for entry in curve:
+            f.write('%f %d %f %f\n' % (entry["dilation"], entry["num_spheres"], entry["coverage_rate"],
+                                        entry["uncoverable"]))
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Coverage Axis for a list of dilations in a single run')
+    parser.add_argument('--mesh', required=True, help='Input mesh file path (.off)')
+    parser.add_argument('--vd', default=None, help='Candidate VD file (v x y z r), e.g. ./input/<name>_VD.txt')
+    parser.add_argument('--candidates', default=None,
+                        help='Candidate inner points (.obj), e.g. ./input/<name>_random.obj; '
+                             'radii are the distances to the nearest surface sample')
+    parser.add_argument('--samples', type=int, default=2000, help='Surface sampling points (default: 2000)')
+    parser.add_argument('--sampling', choices=['random', 'blue_noise'], default='random',
+                        help='Surface sampling method (default: random)')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed of the surface sampling')
+    parser.add_argument('--dilations', type=float, nargs='+', default=[0.02, 0.025, 0.03, 0.04, 0.05],
+                        help='Dilation values to sweep')
+    parser.add_argument('--solver', choices=['heuristic', 'milp'], default='heuristic', help='Coverage solver')
+    parser.add_argument('--max-iter', type=int, default=1000, help='Maximum number of spheres (heuristic)')
+    parser.add_argument('--time-limit', type=float, default=100, help='Time limit per dilation in seconds (milp)')
+    parser.add_argument('--no-local-search', action='store_true',
+                        help='Skip the local search removing the redundant spheres of every solution '
+                             '(faster, but warm-started solutions keep a few percent more spheres)')
+    parser.add_argument('--output-dir', default='./output/dilation_sweep', help='Output directory')
+    args = parser.parse_args()
+
+    if (args.vd is None) == (args.candidates is None):
+        print("Error: exactly one of --vd and --candidates is required")
+        return False
+
+    mesh = trimesh.load(args.mesh)
+    point_set = np.array(sample_surface(mesh, args.samples, method=args.sampling, seed=args.seed)[0])
+    if args.vd is not None:
+        inner_points, radius = read_VD(args.vd)
+        inner_points = np.array(inner_points)
+        radius = np.reshape(np.array(radius), -1)
+    else:
+        inner_points = np.array(trimesh.load(args.candidates).vertices)
+        radius = cKDTree(point_set).query(inner_points, k=1)[0]
+    print("The number of inner candidates: ", len(inner_points))
+    print("The number of surface samples: ", len(point_set))
+
+    curve = dilation_sweep(point_set, inner_points, radius, args.dilations, solver=args.solver,
+                           max_iter=args.max_iter, time_limit=args.time_limit, post_optimize=not args.no_local_search)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    save_obj(os.path.join(args.output_dir, "mesh_samples_%d.obj" % len(point_set)), point_set)
+    for entry in curve:
+        value_pos = entry["selected"]
+        save_txt(os.path.join(args.output_dir, "mesh_selected_inner_points_%.4f.txt" % entry["dilation"]),
+                 np.concatenate((inner_points[value_pos], radius[value_pos, None]), axis=1))
+        write_progressive(os.path.join(args.output_dir,
+                                       "mesh_selected_inner_points_%.4f_progressive.npz" % entry["dilation"]),
+                          inner_points[value_pos], radius[value_pos], entry["order"], entry["prefix_coverage"])
+    save_sweep_curve(os.path.join(args.output_dir, "dilation_curve.txt"), curve)
+    print("Dilation  Spheres  Coverage  Uncoverable")
+    for entry in curve:
+        print(f"{entry['dilation']:<9} {entry['num_spheres']:<8} {100 * entry['coverage_rate']:<7.2f}%  "
+              f"{100 * entry['uncoverable']:.2f}%")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Domain decomposition solver for large Coverage Axis problems
+The surface samples are partitioned by k-means into regions, every region is
+grown by an overlap margin (the samples at most `overlap` farther from its
+center than from their own), and the coverage subproblem of every region (its
+samples, the candidates covering them) is solved independently in a process
+pool sharing the coverage matrix (multiprocessing.shared_memory). The region
+solutions are merged by a reconciliation pass: the samples left uncovered are
+covered by a greedy on them only, and local search removes the spheres made
+redundant by the overlaps (duplicates included).
+"""
+
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+from multiprocessing import util
+
+import numpy as np
+import scipy.sparse as sp
+import trimesh
+from scipy.cluster.vq import kmeans2
+from scipy.spatial import cKDTree
+
+from utils import save_obj, save_txt, read_VD, sample_surface
+from coverage_solver import heuristic_alg, solve_milp, local_search, save_progressive
+from dilation_sweep import build_sorted_coverage, coverage_matrix_at
+from hyperparameter_search import share_arrays, attach_arrays, close_worker
+
+
+def partition_samples(point_set, regions, overlap, seed=None):
+    """Row indices of the overlapping regions of the samples
+
+    A sample belongs to region j if its distance to the center of j is at most
+    overlap more than to its nearest center. The regions of every sample are
+    found by a radius query on a KD-tree of the centers.
+    """
+    regions = min(regions, len(point_set))
+    centers, _ = kmeans2(point_set, regions, minit='++', seed=seed)
+    tree = cKDTree(centers)
+    own, own_region = tree.query(point_set, k=1)
+    neighbors = tree.query_ball_point(point_set, own + overlap, return_sorted=False)
+    counts = np.array([len(nb) for nb in neighbors], dtype=np.int64)
+    # the nearest center is added explicitly, the ball query may miss it by rounding
+    samples = np.concatenate((np.repeat(np.arange(len(point_set)), counts), np.arange(len(point_set))))
+    region = np.concatenate([np.asarray(nb, dtype=np.int64) for nb in neighbors] + [own_region])
+    pairs = np.unique(region * len(point_set) + samples)
+    region, samples = pairs // len(point_set), pairs % len(point_set)
+    bounds = np.searchsorted(region, np.arange(len(centers) + 1))
+    return [samples[bounds[j]:bounds[j + 1]] for j in range(len(centers)) if bounds[j + 1] > bounds[j]]
+
+
+# state of a worker process, set by init_worker
+_WORKER = {}
+
+
+def init_worker(specs):
+    """Attach the worker process to the shared coverage matrix, candidates and radii"""
+    blocks, arrays = attach_arrays(specs)
+    D = sp.csr_matrix((arrays["data"], arrays["indices"], arrays["indptr"]), shape=tuple(arrays["shape"]),
+                      copy=False)
+    _WORKER.update(blocks=blocks, D=D, candidate=arrays["candidate"], radius=arrays["radius"])
+    util.Finalize(None, close_worker, args=(_WORKER,), exitpriority=10)
+
+
+def solve_region(task):
+    """Solve the coverage subproblem of one region, returns the selected global candidates and the runtime"""
+    start = time.time()
+    rows = task["rows"]
+    D_rows = _WORKER["D"][rows]
+    cols = np.unique(D_rows.indices)
+    sub = D_rows[:, cols]
+    if task["solver"] == 'milp':
+        selected = solve_milp(sub, task["time_limit"])
+    else:
+        selected, _, _ = heuristic_alg(sub, _WORKER["candidate"][cols], _WORKER["radius"][cols], reg_radius=1, reg=1,
+                                       max_iter=task["max_iter"], penalty='', progress=False)
+    return cols[selected], time.time() - start
+
+
+def decomposed_solve(D, point_set, candidate, radius_list, regions=8, overlap=None, processes=None,
+                     solver='heuristic', max_iter=1000, time_limit=100, seed=None):
+    """Solve the coverage problem by overlapping regions in parallel, then merge
+
+    D is a scipy sparse (or dense) coverage matrix of point_set x candidate.
+    overlap defaults to the median candidate radius. Samples no candidate covers
+    are ignored. Returns the selected candidates and a report dict.
+    """
+    start = time.time()
+    D = sp.csr_matrix(D)
+    radius_list = np.reshape(radius_list, -1)
+    if overlap is None:
+        overlap = float(np.median(radius_list))
+    coverable = np.nonzero(np.diff(D.indptr) > 0)[0]
+    D_c = D[coverable]
+    region_rows = partition_samples(point_set[coverable], regions, overlap, seed)
+    print(f"{len(region_rows)} regions, {np.mean([len(r) for r in region_rows]):.0f} samples per region on average "
+          f"(overlap {overlap:.4f})")
+
+    blocks, specs = share_arrays({"data": D_c.data, "indices": D_c.indices, "indptr": D_c.indptr,
+                                  "shape": np.array(D_c.shape), "candidate": candidate, "radius": radius_list})
+    tasks = [{"rows": rows, "solver": solver, "max_iter": max_iter, "time_limit": time_limit} for rows in region_rows]
+    try:
+        with multiprocessing.Pool(processes, initializer=init_worker, initargs=(specs,)) as pool:
+            results = pool.map(solve_region, tasks, chunksize=1)
+            # let the workers exit normally, closing their shared memory handles
+            pool.close()
+            pool.join()
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    solve_time = time.time() - start
+
+    # reconciliation: merge, cover what the regions left uncovered, drop the redundant spheres
+    merged = np.unique(np.concatenate([selected for selected, _ in results]))
+    uncovered = np.nonzero(np.asarray(D_c[:, merged].sum(axis=1)).reshape(-1) == 0)[0]
+    repaired = np.zeros(0, dtype=int)
+    if len(uncovered) > 0:
+        repaired, _, _ = heuristic_alg(D_c[uncovered], candidate, radius_list, reg_radius=1, reg=1,
+                                       max_iter=max_iter, penalty='')
+    selected = local_search(D_c, np.concatenate((merged, repaired)))
+    report = {
+        "regions": len(region_rows),
+        "region_times": [t for _, t in results],
+        "merged": len(merged),
+        "repaired": len(repaired),
+        "num_spheres": len(selected),
+        "coverage": float(np.mean(np.asarray(D[:, selected].sum(axis=1)).reshape(-1) > 0)),
+        "solve_time": solve_time,
+        "time": time.time() - start,
+    }
+    print(f"Merged {len(merged)} spheres, {len(uncovered)} uncovered samples repaired with {len(repaired)} spheres, "
+          f"{len(selected)} spheres after reconciliation ({report['time']:.2f}s)")
+    return selected, report
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Coverage Axis by spatial domain decomposition')
+    parser.add_argument('--mesh', required=True, help='Input mesh file path (.off)')
+    parser.add_argument('--vd', default=None, help='Candidate VD file (v x y z r), e.g. ./input/<name>_VD.txt')
+    parser.add_argument('--candidates', default=None,
+                        help='Candidate inner points (.obj), e.g. ./input/<name>_random.obj; '
+                             'radii are the distances to the nearest surface sample')
+    parser.add_argument('--samples', type=int, default=20000, help='Surface sampling points (default: 20000)')
+    parser.add_argument('--sampling', choices=['random', 'blue_noise'], default='random',
+                        help='Surface sampling method (default: random)')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed')
+    parser.add_argument('--dilation', type=float, default=0.02, help='Dilation parameter (default: 0.02)')
+    parser.add_argument('--regions', type=int, default=8, help='Number of regions (default: 8)')
+    parser.add_argument('--overlap', type=float, default=None,
+                        help='Overlap margin of the regions (default: median candidate radius)')
+    parser.add_argument('--processes', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--solver', choices=['heuristic', 'milp'], default='heuristic', help='Solver of the regions')
+    parser.add_argument('--max-iter', type=int, default=1000, help='Maximum number of spheres per region')
+    parser.add_argument('--time-limit', type=float, default=100, help='Time limit per region in seconds (milp)')
+    parser.add_argument('--output-dir', default='./output/domain_decomposition', help='Output directory')
+    args = parser.parse_args()
+
+    if (args.vd is None) == (args.candidates is None):
+        print("Error: exactly one of --vd and --candidates is required")
+        return False
+
+    mesh = trimesh.load(args.mesh)
+    point_set = np.array(sample_surface(mesh, args.samples, method=args.sampling, seed=args.seed)[0])
+    if args.vd is not None:
+        inner_points, radius = read_VD(args.vd)
+        inner_points = np.array(inner_points)
+        radius = np.reshape(np.array(radius), -1)
+    else:
+        inner_points = np.array(trimesh.load(args.candidates).vertices)
+        radius = cKDTree(point_set).query(inner_points, k=1)[0]
+    D = coverage_matrix_at(build_sorted_coverage(point_set, inner_points, radius, args.dilation), args.dilation)
+    print(f"Coverage matrix: {D.shape[0]} samples x {D.shape[1]} candidates, {D.nnz} nonzeros")
+
+    value_pos, report = decomposed_solve(D, point_set, inner_points, radius, args.regions, args.overlap,
+                                         args.processes, args.solver, args.max_iter, args.time_limit, args.seed)
+    print(f"Coverage rate: {100 * report['coverage']:.2f}%")
+    print(f"Number of selected inner points: {len(value_pos)}")
+    os.makedirs(args.output_dir, exist_ok=True)
+    save_obj(os.path.join(args.output_dir, "mesh_selected_inner_points.obj"), inner_points[value_pos])
+    save_txt(os.path.join(args.output_dir, "mesh_selected_inner_points.txt"),
+             np.concatenate((inner_points[value_pos], radius[value_pos, None]), axis=1))
+    save_progressive(os.path.join(args.output_dir, "mesh_selected_inner_points_progressive.npz"), D, value_pos,
+                     inner_points[value_pos], radius[value_pos])
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
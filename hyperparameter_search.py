@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Parallel hyperparameter search for heuristic_alg
+The coverage matrix, the candidates and the radii are built once and placed in
+multiprocessing.shared_memory blocks; every worker process attaches to them
+(numpy arrays over the shared buffers, no copy) and runs greedy configurations
+of reg, reg_radius and penalty. The result is the Pareto front of sphere count
+versus coverage versus runtime.
+"""
+
+import os
+import sys
+import time
+import argparse
+import itertools
+import multiprocessing
+from multiprocessing import shared_memory, util
+
+import numpy as np
+import scipy.sparse as sp
+import trimesh
+from scipy.spatial import cKDTree
+
+from utils import read_VD, sample_surface
+from coverage_solver import heuristic_alg
+from dilation_sweep import build_sorted_coverage, coverage_matrix_at
+
+
+def share_arrays(arrays):
+    """Copy named arrays into new shared memory blocks
+
+    Returns the blocks (to be closed and unlinked by the caller) and the specs
+    (name, shape, dtype) the workers attach with.
+    """
+    blocks, specs = [], {}
+    for key, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        specs[key] = (block.name, array.shape, array.dtype.str)
+    return blocks, specs
+
+
+def attach_arrays(specs):
+    """Numpy views of the shared memory blocks of specs (no copy)"""
+    blocks, arrays = [], {}
+    for key, (name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=name)
+        blocks.append(block)
+        arrays[key] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    return blocks, arrays
+
+
+def close_worker(state):
+    """Drop the arrays of a worker state, then close its shared memory blocks"""
+    blocks = state.pop("blocks", [])
+    state.clear()
+    for block in blocks:
+        block.close()
+
+
+# state of a worker process, set by init_worker
+_WORKER = {}
+
+
+def init_worker(specs):
+    """Attach the worker process to the shared problem"""
+    blocks, arrays = attach_arrays(specs)
+    if "indptr" in arrays:
+        D = sp.csr_matrix((arrays["data"], arrays["indices"], arrays["indptr"]), shape=tuple(arrays["shape"]),
+                          copy=False)
+    else:
+        D = arrays["D"]
+    _WORKER.update(blocks=blocks, D=D, candidate=arrays["candidate"], radius=arrays["radius"])
+    # run when the worker exits, which needs the pool to be closed and joined rather than terminated
+    util.Finalize(None, close_worker, args=(_WORKER,), exitpriority=10)
+
+
+def run_config(config):
+    """Run heuristic_alg with one configuration in a worker"""
+    start = time.time()
+    A, _, coverage_rate = heuristic_alg(_WORKER["D"], _WORKER["candidate"], _WORKER["radius"],
+                                        reg_radius=config["reg_radius"], reg=config["reg"],
+                                        max_iter=config["max_iter"], penalty=config["penalty"], progress=False)
+    return dict(config, selected=A, num_spheres=len(A), coverage=1 - coverage_rate, time=time.time() - start)
+
+
+def pareto_front(results):
+    """Results not dominated in (fewer spheres, higher coverage, lower runtime)"""
+    front = []
+    for r in results:
+        dominated = any(o["num_spheres"] <= r["num_spheres"] and o["coverage"] >= r["coverage"]
+                        and o["time"] <= r["time"]
+                        and (o["num_spheres"] < r["num_spheres"] or o["coverage"] > r["coverage"]
+                             or o["time"] < r["time"])
+                        for o in results)
+        if not dominated:
+            front.append(r)
+    return sorted(front, key=lambda r: (r["num_spheres"], -r["coverage"], r["time"]))
+
+
+def hyperparameter_search(D, candidate, radius_list, regs=(0, 0.5, 1, 2), reg_radii=(0, 0.5, 1, 2),
+                          penalties=('stand', 'max'), max_iter=1000, processes=None):
+    """Run heuristic_alg for every combination of reg, reg_radius and penalty in parallel
+
+    D is a dense array or a scipy sparse matrix, shared with the workers without
+    copy. penalty 'stand' standardizes 1 / radius, any other value uses
+    0.1 * max radius / radius (see heuristic_step).
+    Returns all the results and their Pareto front.
+    """
+    if sp.issparse(D):
+        D = D.tocsr()
+        arrays = {"data": D.data, "indices": D.indices, "indptr": D.indptr, "shape": np.array(D.shape)}
+    else:
+        arrays = {"D": D}
+    arrays["candidate"] = candidate
+    arrays["radius"] = np.reshape(radius_list, -1)
+    configs = [{"reg": reg, "reg_radius": reg_radius, "penalty": penalty, "max_iter": max_iter}
+               for reg, reg_radius, penalty in itertools.product(regs, reg_radii, penalties)]
+
+    blocks, specs = share_arrays(arrays)
+    try:
+        with multiprocessing.Pool(processes, initializer=init_worker, initargs=(specs,)) as pool:
+            results = pool.map(run_config, configs, chunksize=1)
+            # let the workers exit normally, closing their shared memory handles
+            pool.close()
+            pool.join()
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    return results, pareto_front(results)
+
+
+def save_results(path, results):
+    """Save results as a table (reg reg_radius penalty num_spheres coverage time)"""
+    with open(path, 'w') as f:
+        f.write('reg reg_radius penalty num_spheres coverage time\n')
+        for r in results:
+            f.write('%g %g %s %d %f %f\n' % (r["reg"], r["reg_radius"], r["penalty"], r["num_spheres"],
+                                              r["coverage"], r["time"]))
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Parallel hyperparameter search for the Coverage Axis greedy')
+    parser.add_argument('--mesh', required=True, help='Input mesh file path (.off)')
+    parser.add_argument('--vd', default=None, help='Candidate VD file (v x y z r), e.g. ./input/<name>_VD.txt')
+    parser.add_argument('--candidates', default=None,
+                        help='Candidate inner points (.obj), e.g. ./input/<name>_random.obj; '
+                             'radii are the distances to the nearest surface sample')
+    parser.add_argument('--samples', type=int, default=2000, help='Surface sampling points (default: 2000)')
+    parser.add_argument('--sampling', choices=['random', 'blue_noise'], default='random',
+                        help='Surface sampling method (default: random)')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed of the surface sampling')
+    parser.add_argument('--dilation', type=float, default=0.02, help='Dilation parameter (default: 0.02)')
+    parser.add_argument('--regs', type=float, nargs='+', default=[0, 0.5, 1, 2], help='Values of reg')
+    parser.add_argument('--reg-radii', type=float, nargs='+', default=[0, 0.5, 1, 2], help='Values of reg_radius')
+    parser.add_argument('--penalties', nargs='+', default=['stand', 'max'],
+                        help="Radius penalties: 'stand' (standardized 1 / radius) and/or 'max' (0.1 * r_max / r)")
+    parser.add_argument('--max-iter', type=int, default=1000, help='Maximum number of spheres')
+    parser.add_argument('--processes', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--output-dir', default='./output/hyperparameter_search', help='Output directory')
+    args = parser.parse_args()
+
+    if (args.vd is None) == (args.candidates is None):
+        print("Error: exactly one of --vd and --candidates is required")
+        return False
+
+    mesh = trimesh.load(args.mesh)
+    point_set = np.array(sample_surface(mesh, args.samples, method=args.sampling, seed=args.seed)[0])
+    if args.vd is not None:
+        inner_points, radius = read_VD(args.vd)
+        inner_points = np.array(inner_points)
+        radius = np.reshape(np.array(radius), -1)
+    else:
+        inner_points = np.array(trimesh.load(args.candidates).vertices)
+        radius = cKDTree(point_set).query(inner_points, k=1)[0]
+    D = coverage_matrix_at(build_sorted_coverage(point_set, inner_points, radius, args.dilation), args.dilation)
+    print(f"Coverage matrix: {D.shape[0]} samples x {D.shape[1]} candidates, {D.nnz} nonzeros")
+
+    results, front = hyperparameter_search(D, inner_points, radius, args.regs, args.reg_radii, args.penalties,
+                                           args.max_iter, args.processes)
+    os.makedirs(args.output_dir, exist_ok=True)
+    save_results(os.path.join(args.output_dir, "results.txt"), results)
+    save_results(os.path.join(args.output_dir, "pareto_front.txt"), front)
+    print("Pareto front (reg, reg_radius, penalty):")
+    for r in front:
+        print(f"  {r['reg']:g} {r['reg_radius']:g} {r['penalty']}: {r['num_spheres']} spheres, "
+              f"coverage {100 * r['coverage']:.2f}%, {r['time']:.2f}s")
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fast inside/outside classification of candidate points
+Nearly all candidates lie deep inside or far outside the shape, where the exact
+generalized winding number is not needed. The mesh surface is voxelized once
+(conservatively: every voxel the surface touches is marked), the remaining
+voxels are split into connected components (flood fill) and every component is
+classified by the winding number of a few probe points. A point in an interior
+or exterior voxel is then classified by a single array lookup, and only points
+in surface voxels go on to the exact winding number. Grids are cached per mesh.
+Alternatively, the winding numbers are computed on a coarse proxy of the mesh
+(vertex clustering) with a known maximum deviation, and only the points close
+enough to the surface for the deviation to matter go on to the full mesh.
+"""
+
+import os
+import hashlib
+
+import numpy as np
+import torch
+from scipy import ndimage
+from scipy.spatial import cKDTree
+
+from utils import winding_number_fused, winding_number_face_data
+
+# voxel states of the occupancy grid
+OUTSIDE = 0
+INSIDE = 1
+BOUNDARY = 2
+
+
+def mesh_fingerprint(mesh_vertices, mesh_faces):
+    """Content hash of a mesh"""
+    h = hashlib.sha1()
+    h.update(np.ascontiguousarray(mesh_vertices, dtype=np.float64).tobytes())
+    h.update(np.ascontiguousarray(mesh_faces, dtype=np.int64).tobytes())
+    return h.hexdigest()
+
+
+def default_device():
+    """GPU if available, CPU otherwise"""
+    return 'cuda' if torch.cuda.is_available() else 'cpu'
+
+
+def winding_number_chunked(points, mesh_vertices, mesh_faces, chunk_size=65536, device=None):
+    """Exact generalized winding numbers of points, by chunks of points (numpy in, numpy out)"""
+    device = device or default_device()
+    verts_g = torch.tensor(np.asarray(mesh_vertices), device=device).double()
+    faces_g = torch.tensor(np.asarray(mesh_faces), device=device).long()
+    face_data = winding_number_face_data(verts_g, faces_g)
+    winding = np.empty(len(points))
+    for start in range(0, len(points), chunk_size):
+        pts_g = torch.tensor(np.asarray(points[start:start + chunk_size]), device=device).double()
+        winding[start:start + chunk_size] = winding_number_fused(pts_g, verts_g, faces_g, face_data).cpu().numpy()
+    return winding
+
+
+def surface_voxels(mesh_vertices, mesh_faces, origin, pitch, shape, max_points=1 << 22):
+    """Conservative surface voxelization
+
+    Every triangle is sampled on a barycentric lattice of spacing <= pitch / 2,
+    so every point of the surface lies within pitch / 2 of a lattice point, and
+    the voxels of the lattice points dilated by one voxel contain every voxel
+    the surface intersects.
+    """
+    occupied = np.zeros(shape, dtype=bool)
+    tri = np.asarray(mesh_vertices, dtype=np.float64)[np.asarray(mesh_faces)]  # f, 3, 3
+    edge_len = np.max(np.linalg.norm(tri - tri[:, [1, 2, 0]], axis=2), axis=1)
+    n_sub = np.maximum(1, np.ceil(edge_len / (pitch / 2))).astype(np.int64)
+    for n in np.unique(n_sub):
+        i, j = np.meshgrid(np.arange(n + 1), np.arange(n + 1), indexing='ij')
+        keep = i + j <= n
+        a, b = i[keep] / n, j[keep] / n
+        bary = np.stack((a, b, 1 - a - b), axis=1)  # k, 3
+        group = np.nonzero(n_sub == n)[0]
+        step = max(1, max_points // len(bary))
+        for start in range(0, len(group), step):
+            pts = np.einsum('kc,fcd->fkd', bary, tri[group[start:start + step]]).reshape(-1, 3)
+            idx = np.floor((pts - origin) / pitch).astype(np.int64)
+            idx = np.clip(idx, 0, np.array(shape) - 1)
+            occupied[idx[:, 0], idx[:, 1], idx[:, 2]] = True
+    return ndimage.binary_dilation(occupied, structure=np.ones((3, 3, 3), dtype=bool))
+
+
+def build_occupancy_grid(mesh_vertices, mesh_faces, resolution=128, probes=8, device=None, seed=0):
+    """Occupancy grid of a mesh: OUTSIDE / INSIDE / BOUNDARY state of every voxel
+
+    resolution is the number of voxels along the longest side of the bounding box.
+    Every connected component of non-surface voxels is probed with the exact
+    winding number at up to `probes` voxel centers; components whose probes
+    disagree (e.g. through holes of a non-watertight mesh) are left BOUNDARY.
+    """
+    mesh_vertices = np.asarray(mesh_vertices, dtype=np.float64)
+    min_corner = np.min(mesh_vertices, axis=0)
+    max_corner = np.max(mesh_vertices, axis=0)
+    pitch = float(np.max(max_corner - min_corner)) / resolution
+    # two voxels of padding: the border layer is never a surface voxel
+    origin = min_corner - 2 * pitch
+    shape = tuple(np.ceil((max_corner - min_corner) / pitch).astype(np.int64) + 4)
+
+    surface = surface_voxels(mesh_vertices, mesh_faces, origin, pitch, shape)
+    labels, n_components = ndimage.label(~surface)
+    state = np.full(shape, BOUNDARY, dtype=np.int8)
+
+    flat_labels = labels.reshape(-1)
+    free = np.nonzero(flat_labels)[0]
+    order = np.argsort(flat_labels[free], kind='stable')
+    free = free[order]
+    bounds = np.searchsorted(flat_labels[free], np.arange(1, n_components + 2))
+    rng = np.random.default_rng(seed)
+    probe_voxels, probe_component = [], []
+    for c in range(n_components):
+        members = free[bounds[c]:bounds[c + 1]]
+        chosen = members if len(members) <= probes else rng.choice(members, probes, replace=False)
+        probe_voxels.append(chosen)
+        probe_component.append(np.full(len(chosen), c))
+    probe_voxels = np.concatenate(probe_voxels) if probe_voxels else np.zeros(0, dtype=np.int64)
+    probe_component = np.concatenate(probe_component) if probe_component else np.zeros(0, dtype=np.int64)
+    centers = origin + (np.stack(np.unravel_index(probe_voxels, shape), axis=1) + 0.5) * pitch
+    inside = winding_number_chunked(centers, mesh_vertices, mesh_faces, device=device) > 0.5
+
+    n_inside = np.bincount(probe_component, weights=inside, minlength=n_components)
+    n_probes = np.bincount(probe_component, minlength=n_components)
+    component_state = np.full(n_components + 1, BOUNDARY, dtype=np.int8)
+    component_state[1:][n_inside == n_probes] = INSIDE
+    component_state[1:][n_inside == 0] = OUTSIDE
+    state = np.where(surface, BOUNDARY, component_state[labels]).astype(np.int8)
+    return {"origin": origin, "pitch": pitch, "state": state}
+
+
+def load_occupancy_grid(mesh_vertices, mesh_faces, resolution=128, cache_dir='./cache', device=None):
+    """Occupancy grid of a mesh, built once and cached in cache_dir"""
+    cache_file = None
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        cache_file = os.path.join(cache_dir, "occupancy_%s_%d.npz" % (mesh_fingerprint(mesh_vertices, mesh_faces),
+                                                                      resolution))
+        if os.path.exists(cache_file):
+            with np.load(cache_file) as data:
+                return {"origin": data["origin"], "pitch": float(data["pitch"]), "state": data["state"]}
+    grid = build_occupancy_grid(mesh_vertices, mesh_faces, resolution, device=device)
+    if cache_file is not None:
+        np.savez_compressed(cache_file, origin=grid["origin"], pitch=grid["pitch"], state=grid["state"])
+    return grid
+
+
+def occupancy_state(grid, points):
+    """Voxel state of points (OUTSIDE outside the grid)"""
+    idx = np.floor((np.asarray(points) - grid["origin"]) / grid["pitch"]).astype(np.int64)
+    shape = np.array(grid["state"].shape)
+    in_grid = np.all((idx >= 0) & (idx < shape), axis=1)
+    state = np.full(len(idx), OUTSIDE, dtype=np.int8)
+    state[in_grid] = grid["state"][idx[in_grid, 0], idx[in_grid, 1], idx[in_grid, 2]]
+    return state
+
+
+def occupancy_winding_number(points, mesh_vertices, mesh_faces, grid=None, resolution=128, cache_dir='./cache',
+                             device=None):
+    """Winding numbers of points, exact near the surface only
+
+    Points in interior voxels get 1 and points in exterior voxels 0 by a grid
+    lookup; points in surface voxels get their exact winding number. Thresholding
+    at 0.5 gives the same classification as winding_number.
+    """
+    if grid is None:
+        grid = load_occupancy_grid(mesh_vertices, mesh_faces, resolution, cache_dir, device)
+    state = occupancy_state(grid, points)
+    winding = (state == INSIDE).astype(np.float64)
+    boundary = np.nonzero(state == BOUNDARY)[0]
+    if len(boundary) > 0:
+        winding[boundary] = winding_number_chunked(np.asarray(points)[boundary], mesh_vertices, mesh_faces,
+                                                   device=device)
+    return winding
+
+
+def build_proxy_mesh(mesh_vertices, mesh_faces, resolution=32):
+    """Coarse proxy of a mesh by vertex clustering, with its deviation from the mesh
+
+    The vertices of every cell of a grid (resolution cells along the longest
+    side of the bounding box) are merged into their mean, and the faces that
+    become degenerate are dropped. Every point of a face moves with the same
+    barycentric coordinates, so no point of a face moves by more than the
+    largest displacement of its vertices, and the winding number of a point
+    farther than that from every face is the same on the proxy. Each face
+    records this bound plus the radius of its bounding ball around its centroid
+    (face_reach), and the largest vertex displacement is the deviation.
+    """
+    mesh_vertices = np.asarray(mesh_vertices, dtype=np.float64)
+    mesh_faces = np.asarray(mesh_faces, dtype=np.int64)
+    min_corner = np.min(mesh_vertices, axis=0)
+    pitch = float(np.max(np.max(mesh_vertices, axis=0) - min_corner)) / resolution
+    cells = np.floor((mesh_vertices - min_corner) / pitch).astype(np.int64)
+    _, cluster = np.unique(cells, axis=0, return_inverse=True)
+    cluster = cluster.reshape(-1)
+    count = np.bincount(cluster)
+    vertices = np.stack([np.bincount(cluster, weights=mesh_vertices[:, d]) / count for d in range(3)], axis=1)
+    faces = cluster[mesh_faces]
+    faces = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])]
+    displacement = np.linalg.norm(mesh_vertices - vertices[cluster], axis=1)
+    tri = mesh_vertices[mesh_faces]
+    face_centers = np.mean(tri, axis=1)
+    face_radius = np.max(np.linalg.norm(tri - face_centers[:, None, :], axis=2), axis=1)
+    return {
+        "vertices": vertices,
+        "faces": faces,
+        "deviation": float(np.max(displacement)),
+        "face_centers": face_centers,
+        "face_reach": np.max(displacement[mesh_faces], axis=1) + face_radius,
+    }
+
+
+def load_proxy_mesh(mesh_vertices, mesh_faces, resolution=32, cache_dir='./cache'):
+    """Proxy mesh of a mesh, built once and cached in cache_dir, with a KD-tree of the mesh face centroids"""
+    proxy = None
+    cache_file = None
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        cache_file = os.path.join(cache_dir, "proxy_%s_%d.npz" % (mesh_fingerprint(mesh_vertices, mesh_faces),
+                                                                  resolution))
+        if os.path.exists(cache_file):
+            with np.load(cache_file) as data:
+                if "face_reach" in data.files:
+                    proxy = {key: data[key] for key in ("vertices", "faces", "face_centers", "face_reach")}
+                    proxy["deviation"] = float(data["deviation"])
+    if proxy is None:
+        proxy = build_proxy_mesh(mesh_vertices, mesh_faces, resolution)
+        if cache_file is not None:
+            np.savez_compressed(cache_file, **proxy)
+    proxy["tree"] = cKDTree(proxy["face_centers"])
+    return proxy
+
+
+def near_proxy_deviation(proxy, points, chunk_size=10000):
+    """Mask of the points within the deviation bound of a mesh face, where the proxy may differ
+
+    A point at distance d from a face centroid is at least d minus the face
+    radius from the face; only the points with a centroid within the largest
+    face reach go through the per-face test.
+    """
+    tree, reach = proxy["tree"], proxy["face_reach"]
+    max_reach = float(np.max(reach))
+    near = np.isfinite(tree.query(points, k=1, distance_upper_bound=max_reach)[0])
+    candidates = np.nonzero(near)[0]
+    for start in range(0, len(candidates), chunk_size):
+        idx = candidates[start:start + chunk_size]
+        neighbors = tree.query_ball_point(points[idx], max_reach, return_sorted=False)
+        counts = np.array([len(nb) for nb in neighbors], dtype=np.int64)
+        point_of_pair = np.repeat(np.arange(len(idx)), counts)
+        face_of_pair = np.concatenate([np.asarray(nb, dtype=np.int64) for nb in neighbors])
+        dist = np.linalg.norm(points[idx][point_of_pair] - proxy["face_centers"][face_of_pair], axis=1)
+        near[idx] = np.bincount(point_of_pair, weights=dist <= reach[face_of_pair], minlength=len(idx)) > 0
+    return near
+
+
+def proxy_winding_number(points, mesh_vertices, mesh_faces, proxy=None, resolution=32, cache_dir='./cache',
+                         device=None):
+    """Winding numbers of points on the proxy mesh, on the full mesh near the surface only
+
+    The points within the deviation bound of a mesh face (see
+    near_proxy_deviation) get the winding number of the full mesh. Thresholding
+    at 0.5 gives the same classification as winding_number.
+    """
+    if proxy is None:
+        proxy = load_proxy_mesh(mesh_vertices, mesh_faces, resolution, cache_dir)
+    points = np.asarray(points, dtype=np.float64)
+    winding = winding_number_chunked(points, proxy["vertices"], proxy["faces"], device=device)
+    near = np.nonzero(near_proxy_deviation(proxy, points))[0]
+    if len(near) > 0:
+        winding[near] = winding_number_chunked(points[near], mesh_vertices, mesh_faces, device=device)
+    return winding
@@ -7,11 +7,14 @@ Updated: Improved according to QMAT usage guide, supports independent output dir
 """
 
 import os
+import re
 import sys
 import argparse
 import shutil
 import subprocess
 import glob
+import json
+import hashlib
 from pathlib import Path
 from datetime import datetime
 
@@ -19,55 +22,17 @@ try:
     import torch
     import trimesh
     import numpy as np
-    from tqdm import tqdm
-    from utils import save_obj, save_txt, read_VD, winding_number
+    from utils import save_obj, save_txt, read_VD, sample_surface
+    from coverage_solver import compare_batch_selection, solve_coverage, local_search, save_progressive
+    import out_of_core
+    from skeleton_connection import run_native_connection
     DEPENDENCIES_AVAILABLE = True
 except ImportError as e:
     print(f"Warning: Missing dependency library: {e}")
-    print("Please install: pip install torch trimesh numpy tqdm")
+    print("Please install: pip install torch trimesh numpy scipy tqdm")
     DEPENDENCIES_AVAILABLE = False
 
 
-def heuristic_alg(D, candidate, radius_list, reg_radius=1, reg=1, max_iter=1000, penalty='stand'):
-    """Heuristic algorithm for solving coverage problem"""
-    m, n = D.shape
-    S = np.arange(m)
-    A = []
-    grade = []
-    pbar = tqdm(range(max_iter))
-    for i in pbar:
-        score = np.sum(D[S], axis=0).astype(float)
-        score = (score - np.mean(score)) / np.std(score, ddof=1)
-        if len(A) > 0:
-            loss = compute_min_distances(candidate, candidate[A])
-            loss = (loss - np.mean(loss)) / np.std(loss, ddof=1)
-            score += reg * loss
-        if penalty == 'stand':
-            loss_radius = 1 / radius_list
-            loss_radius = (loss_radius - np.mean(loss_radius)) / np.std(loss_radius, ddof=1)
-        else:
-            radius_max = np.max(radius_list)
-            loss_radius = 0.1 * radius_max / radius_list
-        score -= reg_radius * loss_radius
-        i_k = np.argmax(score)
-        A.append(i_k)
-        grade.append(score[i_k])
-        S = S[D[S, i_k] == 0]
-        if len(S) == 0:
-            break
-        pbar.set_description(f'Coverage rate: {1 - len(S) / m:.4f}')
-    coverage_rate = len(S) / m
-    A = np.array(A)
-    return A, grade, coverage_rate
-
-
-def compute_min_distances(X, selected_pts):
-    """Compute minimum distances"""
-    distances = np.linalg.norm(X[:, np.newaxis] - selected_pts, axis=2)
-    min_distances = np.min(distances, axis=1)
-    return min_distances
-
-
 def create_run_directory(mesh_path, base_output_dir="./runs"):
     """Create independent output directory for each run"""
     # Get mesh filename (without extension)
@@ -91,6 +56,106 @@ def create_run_directory(mesh_path, base_output_dir="./runs"):
     return run_dir
 
 
+def find_latest_run_directory(mesh_path, base_output_dir="./runs"):
+    """Find the most recent run directory of a mesh, used by --resume"""
+    mesh_name = Path(mesh_path).stem
+    # only <mesh_name>_<timestamp>, not the runs of meshes sharing the prefix (e.g. bird_v2 for bird)
+    pattern = re.compile(re.escape(mesh_name) + r"_\d{8}_\d{6}")
+    run_dirs = [d for d in glob.glob(os.path.join(base_output_dir, f"{mesh_name}_*"))
+                if pattern.fullmatch(os.path.basename(d)) and os.path.isdir(d)
+                and os.path.exists(os.path.join(d, STAGE_MANIFEST))]
+    if not run_dirs:
+        return None
+    # Timestamps in the directory names sort chronologically
+    return sorted(run_dirs)[-1]
+
+
+# Stage graph of the integrated pipeline
+# Every stage records a fingerprint of its parameters and input files in
+# <run_dir>/stages.json, together with the files it produced. When a run is
+# resumed, a stage whose fingerprint is unchanged reuses its recorded outputs;
+# since outputs are fingerprinted by content in the downstream stages, a
+# re-executed stage only invalidates the stages that actually depend on it.
+STAGE_MANIFEST = "stages.json"
+# Solver state of the selection stage (in the coverage output directory)
+SELECTION_CHECKPOINT = "selection_checkpoint.npz"
+
+
+def fingerprint_file(path, chunk_size=1 << 20):
+    """Content hash of a file"""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def compute_stage_fingerprint(name, params, input_files):
+    """Fingerprint of a stage from its name, parameters and input file contents"""
+    h = hashlib.sha1()
+    h.update(name.encode('utf-8'))
+    h.update(json.dumps(params, sort_keys=True, default=str).encode('utf-8'))
+    for path in input_files:
+        h.update(fingerprint_file(path).encode('utf-8'))
+    return h.hexdigest()
+
+
+def load_stage_manifest(run_dir):
+    """Load stage records of a run directory (empty for a fresh run)"""
+    manifest_file = os.path.join(run_dir, STAGE_MANIFEST)
+    if not os.path.exists(manifest_file):
+        return {}
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_stage_manifest(run_dir, manifest):
+    """Save stage records of a run directory"""
+    manifest_file = os.path.join(run_dir, STAGE_MANIFEST)
+    with open(manifest_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def run_stage(name, run_dir, manifest, params, input_files, stage_func, state_files=()):
+    """Run one stage of the pipeline, or reuse its outputs if its inputs are unchanged
+
+    stage_func takes no arguments and returns a dict {output name: file path},
+    or None on failure. state_files are the files a stage resumes from (e.g. a
+    solver checkpoint), removed with the outputs when the fingerprint changed.
+    Returns the outputs dict (paths relative to the current directory), or None
+    if the stage failed.
+    """
+    fingerprint = compute_stage_fingerprint(name, params, input_files)
+    record = manifest.get(name)
+    if record is not None:
+        outputs = {key: os.path.join(run_dir, value) for key, value in record["outputs"].items()}
+        if record["fingerprint"] == fingerprint and all(os.path.exists(p) for p in outputs.values()):
+            print(f"[{name}] Inputs unchanged, reusing previous outputs")
+            return outputs
+        # Remove stale outputs so that glob-based lookups cannot pick them up again
+        for path in list(outputs.values()) + list(state_files):
+            if os.path.isfile(path):
+                os.remove(path)
+        del manifest[name]
+        save_stage_manifest(run_dir, manifest)
+
+    print(f"[{name}] Running stage")
+    outputs = stage_func()
+    if outputs is None:
+        return None
+
+    manifest[name] = {
+        "fingerprint": fingerprint,
+        "params": params,
+        "inputs": [os.path.abspath(p) for p in input_files],
+        "outputs": {key: os.path.relpath(value, run_dir) for key, value in outputs.items()},
+        "finished": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    # Save after every stage so that a failure later on keeps the finished ones
+    save_stage_manifest(run_dir, manifest)
+    return outputs
+
+
 def extract_vertices_from_ma(input_file, output_file):
     """Extract vertex information from .ma file and save in VD format"""
     vertices = []
@@ -164,78 +229,152 @@ def run_qmat_step1(qmat_path, input_mesh_path, input_ma_path, target_vertices=50
         return False, None
 
 
-def run_coverage_axis(input_mesh_path, vd_file_path, output_dir, surface_sample_num=3000, dilation=0.05):
-    """Run CoverageAxis algorithm"""
-    print("Step 2: Running CoverageAxis algorithm...")
-    
+def run_surface_sampling(input_mesh_path, output_dir, surface_sample_num=3000, method='random', seed=None):
+    """Sample the surface points to be covered ('random' or 'blue_noise' sampling)"""
     if not DEPENDENCIES_AVAILABLE:
-        print("Error: Missing necessary dependency libraries, cannot run CoverageAxis")
-        return False
-    
+        print("Error: Missing necessary dependency libraries, cannot sample surface")
+        return None
+
     # Load mesh
     mesh = trimesh.load(input_mesh_path)
-    point_set = trimesh.sample.sample_surface(mesh, surface_sample_num)
-    
+    point_set = sample_surface(mesh, surface_sample_num, method=method, seed=seed)
+
     mesh_faces = np.array(mesh.faces)
     mesh_vertices = np.array(mesh.vertices)
     point_set = np.array(point_set[0])
-    
+
     print(f"Mesh info: faces={mesh_faces.shape[0]}, vertices={mesh_vertices.shape[0]}, sampling points={point_set.shape[0]}")
-    
+
+    # Ensure output directory exists
+    os.makedirs(output_dir, exist_ok=True)
+
+    samples_file = os.path.join(output_dir, "surface_samples.npy")
+    np.save(samples_file, point_set)
+    save_obj(os.path.join(output_dir, "mesh.obj"), mesh_vertices, mesh_faces)
+    save_obj(os.path.join(output_dir, f"mesh_samples_{surface_sample_num}.obj"), point_set)
+    return {"samples": samples_file}
+
+
+def run_coverage_matrix(samples_file, vd_file_path, output_dir, dilation=0.05, out_of_core_mode=False):
+    """Compute the coverage matrix of the surface samples by the dilated candidate spheres
+
+    With out_of_core_mode, the coverage matrix is written to a memory-mapped
+    .npy file tile by tile instead of being held in memory.
+    """
+    if not DEPENDENCIES_AVAILABLE:
+        print("Error: Missing necessary dependency libraries, cannot compute coverage matrix")
+        return None
+
+    point_set = np.load(samples_file)
+
     # Read VD file
     try:
         inner_points, radius = read_VD(vd_file_path)
         inner_points = np.array(inner_points)
         radius_ori = np.array(radius)
         radius = radius_ori + dilation
-        radius_list = np.reshape(radius_ori, -1)
         print(f"Read {len(inner_points)} interior points from VD file")
     except Exception as e:
         print(f"Failed to read VD file: {e}")
-        return False
-    
+        return None
+
     # Ensure output directory exists
     os.makedirs(output_dir, exist_ok=True)
-    
-    # Save intermediate results
-    save_obj(os.path.join(output_dir, "mesh.obj"), mesh_vertices, mesh_faces)
-    save_obj(os.path.join(output_dir, f"mesh_samples_{surface_sample_num}.obj"), point_set)
     save_obj(os.path.join(output_dir, "mesh_inner_points.obj"), inner_points)
-    
+
+    outputs = {
+        "coverage_matrix": os.path.join(output_dir, "coverage_matrix.npy"),
+        "candidates": os.path.join(output_dir, "candidates.npy"),
+        "radius": os.path.join(output_dir, "candidate_radius.npy"),
+    }
+
     # Calculate coverage matrix
     print("Calculating coverage matrix...")
+    if out_of_core_mode:
+        np.save(outputs["candidates"], inner_points)
+        np.save(outputs["radius"], radius_ori)
+        out_of_core.coverage_matrix(point_set, np.load(outputs["candidates"], mmap_mode='r'),
+                                    np.load(outputs["radius"], mmap_mode='r'), dilation,
+                                    outputs["coverage_matrix"])
+        return outputs
+
     point_set_g = torch.tensor(point_set).cuda().double()
     innerpoints_g = torch.tensor(inner_points).cuda().double()
     radius_g = torch.tensor(radius).cuda().double()
     radius_g = radius_g[:, 0]
     radius_g = radius_g.unsqueeze(0).repeat(len(point_set), 1)
-    D = torch.cdist(point_set_g, innerpoints_g, p=2)
-    D = torch.gt(radius_g, D).type(torch.int)
+    D = torch.gt(radius_g, torch.cdist(point_set_g, innerpoints_g, p=2)).type(torch.int)
     D = D.cpu().numpy()
     candidates = innerpoints_g.cpu().numpy()
-    
+
+    np.save(outputs["coverage_matrix"], D)
+    np.save(outputs["candidates"], candidates)
+    np.save(outputs["radius"], radius_ori)
+    return outputs
+
+
+def run_selection(coverage_files, output_dir, max_iter=100, batch_size=1, compare_batch=False,
+                  solver='heuristic', target_coverage=1.0, time_budget=None, resume=False, out_of_core_mode=False,
+                  post_optimize=False):
+    """Select the interior points covering the surface samples
+
+    Stops at whichever comes first of the target coverage rate, the time budget
+    (in seconds) and max_iter spheres. The solver state is checkpointed in
+    output_dir; with resume, an interrupted selection continues from it.
+    With out_of_core_mode, the coverage matrix is memory-mapped and read by tiles.
+    With post_optimize, redundant spheres of the solution are removed by local search.
+    """
+    if not DEPENDENCIES_AVAILABLE:
+        print("Error: Missing necessary dependency libraries, cannot run selection")
+        return None
+
+    D = np.load(coverage_files["coverage_matrix"], mmap_mode='r' if out_of_core_mode else None)
+    candidates = np.load(coverage_files["candidates"])
+    radius_ori = np.load(coverage_files["radius"])
+    radius_list = np.reshape(radius_ori, -1)
+
     # Solve using heuristic algorithm
-    print("Solving coverage problem using heuristic algorithm...")
-    value_pos, grade, coverage_rate = heuristic_alg(D, candidates, radius_list, 
-                                                   reg_radius=1, reg=1, max_iter=100, penalty='')
-    
-    print(f"Coverage rate: {100*(1-coverage_rate):.2f}%")
+    print(f"Solving coverage problem using {solver} algorithm...")
+    if batch_size > 1 and compare_batch:
+        compare_batch_selection(D, candidates, radius_list, batch_size,
+                                reg_radius=1, reg=1, max_iter=max_iter, penalty='')
+    os.makedirs(output_dir, exist_ok=True)
+    checkpoint = os.path.join(output_dir, SELECTION_CHECKPOINT)
+    if not resume and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    solution = solve_coverage(D, candidates, radius_list, solver=solver, target_coverage=target_coverage,
+                              time_budget=time_budget, max_spheres=max_iter, checkpoint=checkpoint,
+                              reg_radius=1, reg=1, penalty='', batch_size=batch_size)
+    value_pos = solution["selected"]
+    if post_optimize:
+        value_pos = local_search(D, value_pos)
+
+    print(f"Coverage rate: {100*solution['coverage']:.2f}%")
     print(f"Number of selected interior points: {len(value_pos)}")
-    
+
     # Save results
-    selected_points = inner_points[value_pos]
+    selected_points = candidates[value_pos]
     selected_radius = radius_ori[value_pos]
-    
+
+    os.makedirs(output_dir, exist_ok=True)
     save_obj(os.path.join(output_dir, "mesh_selected_inner_points.obj"), selected_points)
-    save_txt(os.path.join(output_dir, "mesh_selected_inner_points.txt"), 
-             np.concatenate((selected_points, selected_radius), axis=1))
-    
+    selected_txt_file = os.path.join(output_dir, "mesh_selected_inner_points.txt")
+    save_txt(selected_txt_file, np.concatenate((selected_points, selected_radius), axis=1))
+    # Importance ordering with the coverage of every prefix, any sphere budget is a prefix slice
+    progressive_file = os.path.join(output_dir, "mesh_selected_inner_points_progressive.npz")
+    save_progressive(progressive_file, D, value_pos, selected_points, selected_radius)
+
     # Save selected points for QMAT (format: v x y z r)
     points_with_radius = np.concatenate((selected_points, selected_radius), axis=1)
     selected_points_file = os.path.join(output_dir, "selected_points_for_qmat.txt")
     save_selected_points_for_qmat(points_with_radius, selected_points_file)
-    
-    return True, selected_points_file
+
+    # Indices of the selected candidates (vertices of the MA file), used by the native connection
+    selected_indices_file = os.path.join(output_dir, "selected_indices.npy")
+    np.save(selected_indices_file, np.asarray(value_pos, dtype=np.int64))
+
+    return {"selected_points": selected_txt_file, "selected_points_for_qmat": selected_points_file,
+            "selected_indices": selected_indices_file, "progressive": progressive_file}
 
 
 def run_qmat_step2(qmat_path, input_mesh_path, input_ma_path, target_vertices, 
@@ -294,7 +433,13 @@ def save_run_info(run_dir, args, results):
         f.write(f"Target number of spheres: {args.vertices}\n")
         f.write(f"Surface sampling points: {args.samples}\n")
         f.write(f"Dilation parameter: {args.dilation}\n")
+        f.write(f"Surface sampling: {args.sampling} (seed: {args.seed})\n")
         f.write(f"Skip step 1: {args.skip_step1}\n")
+        f.write(f"Skeleton connection: {args.connect}\n")
+        f.write(f"Maximum selected spheres: {args.max_iter}\n")
+        f.write(f"Greedy batch size: {args.batch_size}\n")
+        f.write(f"Local search: {args.local_search}\n")
+        f.write(f"Solver: {args.solver} (target coverage: {args.target_coverage}, time budget: {args.time_budget})\n")
         f.write("\n")
         f.write("Generated files:\n")
         for key, value in results.items():
@@ -310,12 +455,38 @@ def main():
     parser = argparse.ArgumentParser(description='Complete pipeline integrating QMAT and CoverageAxis')
     parser.add_argument('--mesh', required=True, help='Input mesh file path (.off)')
     parser.add_argument('--ma', required=True, help='Input MA file path (.ma)')
-    parser.add_argument('--qmat', required=True, help='QMAT executable file path')
+    parser.add_argument('--qmat', default=None,
+                        help='QMAT executable file path (required unless --skip-step1 and --connect native)')
     parser.add_argument('--vertices', type=int, default=500, help='Target number of spheres (default: 500)')
     parser.add_argument('--samples', type=int, default=3000, help='Surface sampling points (default: 3000)')
     parser.add_argument('--dilation', type=float, default=0.05, help='Dilation parameter (default: 0.05)')
+    parser.add_argument('--sampling', choices=['random', 'blue_noise'], default='random',
+                        help='Surface sampling method (default: random)')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed of the surface sampling')
     parser.add_argument('--runs-dir', default='./runs', help='Run directory root (default: ./runs)')
     parser.add_argument('--skip-step1', action='store_true', help='Skip QMAT step 1, directly use original MA file')
+    parser.add_argument('--max-iter', type=int, default=100, help='Maximum number of selected spheres (default: 100)')
+    parser.add_argument('--solver', choices=['heuristic', 'milp'], default='heuristic',
+                        help='Coverage solver; milp refines the heuristic solution in the remaining time budget')
+    parser.add_argument('--target-coverage', type=float, default=1.0,
+                        help='Stop the selection at this coverage rate (default: 1.0)')
+    parser.add_argument('--time-budget', type=float, default=None,
+                        help='Wall-clock budget of the selection in seconds, the best solution so far is kept')
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help='Spheres with disjoint coverage selected per greedy pass (default: 1)')
+    parser.add_argument('--compare-batch', action='store_true',
+                        help='Report the quality delta of --batch-size against the one-at-a-time greedy')
+    parser.add_argument('--local-search', action='store_true',
+                        help='Remove redundant spheres of the selection by local search (removals and 1-for-2 swaps)')
+    parser.add_argument('--connect', choices=['qmat', 'native'], default='qmat',
+                        help='Skeleton connection of the selected poles: QMAT step 2, or in-process '
+                             'Voronoi-region collapse of the medial mesh (default: qmat)')
+    parser.add_argument('--out-of-core', action='store_true',
+                        help='Keep the coverage matrix in a memory-mapped file of the run directory, '
+                             'processed by tiles (heuristic solver)')
+    parser.add_argument('--resume', nargs='?', const='latest', default=None,
+                        help='Resume a previous run directory (default: latest run of this mesh), '
+                             'only re-executing the stages whose inputs changed')
     
     args = parser.parse_args()
     
@@ -328,12 +499,28 @@ def main():
         print(f"Error: MA file does not exist: {args.ma}")
         return False
     
-    if not os.path.exists(args.qmat):
+    needs_qmat = not args.skip_step1 or args.connect == 'qmat'
+    if needs_qmat and (args.qmat is None or not os.path.exists(args.qmat)):
         print(f"Error: QMAT executable does not exist: {args.qmat}")
         return False
     
-    # Create run directory
-    run_dir = create_run_directory(args.mesh, args.runs_dir)
+    # Create run directory, or reuse a previous one when resuming
+    run_dir = None
+    if args.resume is not None:
+        if args.resume == 'latest':
+            run_dir = find_latest_run_directory(args.mesh, args.runs_dir)
+            if run_dir is None:
+                print(f"No previous run of {args.mesh} found in {args.runs_dir}, starting a new run")
+        elif os.path.isdir(args.resume):
+            run_dir = args.resume
+        else:
+            print(f"Error: run directory to resume does not exist: {args.resume}")
+            return False
+    if run_dir is None:
+        run_dir = create_run_directory(args.mesh, args.runs_dir)
+    else:
+        print(f"Resuming run directory: {run_dir}")
+    manifest = load_stage_manifest(run_dir)
     
     # Define subdirectories
     input_dir = os.path.join(run_dir, "input")
@@ -361,34 +548,74 @@ def main():
     results = {}
     
     try:
-        simplified_ma_file = None
+        source_ma_file = args.ma
         
         if not args.skip_step1:
             # Step 1: Use QMAT for regular simplification
-            success, simplified_ma_file = run_qmat_step1(args.qmat, args.mesh, args.ma, 
-                                                        args.vertices, qmat_temp_dir + "/")
-            if not success:
+            def qmat_step1_stage():
+                success, simplified_ma_file = run_qmat_step1(args.qmat, args.mesh, args.ma,
+                                                            args.vertices, qmat_temp_dir + "/")
+                if not success:
+                    return None
+                return {"simplified_ma": simplified_ma_file} if simplified_ma_file else {}
+
+            step1 = run_stage("qmat_step1", run_dir, manifest, {"vertices": args.vertices},
+                              [args.mesh, args.ma, args.qmat], qmat_step1_stage)
+            if step1 is None:
                 print("Step 1 failed, pipeline terminated")
                 return False
+            simplified_ma_file = step1.get("simplified_ma")
             results["QMAT step 1 simplified MA"] = simplified_ma_file
+            if simplified_ma_file and os.path.exists(simplified_ma_file):
+                source_ma_file = simplified_ma_file
         
         # Extract VD file
-        if simplified_ma_file and os.path.exists(simplified_ma_file):
-            print(f"Extracting VD from simplified MA file: {simplified_ma_file}")
-            extract_vertices_from_ma(simplified_ma_file, vd_file)
-        else:
-            print(f"Extracting VD from original MA file: {args.ma}")
-            extract_vertices_from_ma(args.ma, vd_file)
-        results["VD file"] = vd_file
+        def vd_extraction_stage():
+            print(f"Extracting VD from MA file: {source_ma_file}")
+            extract_vertices_from_ma(source_ma_file, vd_file)
+            return {"vd": vd_file}
+
+        vd_extraction = run_stage("vd_extraction", run_dir, manifest, {},
+                                  [source_ma_file], vd_extraction_stage)
+        results["VD file"] = vd_extraction["vd"]
         
-        # Step 2: Run CoverageAxis
-        coverage_result = run_coverage_axis(args.mesh, vd_file, coverage_output_dir, 
-                                          args.samples, args.dilation)
-        if not coverage_result:
+        # Step 2: Run CoverageAxis (surface sampling, coverage matrix and selection)
+        print("Step 2: Running CoverageAxis algorithm...")
+        sampling = run_stage("surface_sampling", run_dir, manifest,
+                             {"samples": args.samples, "method": args.sampling, "seed": args.seed},
+                             [args.mesh],
+                             lambda: run_surface_sampling(args.mesh, coverage_output_dir, args.samples,
+                                                          args.sampling, args.seed))
+        if sampling is None:
+            print("Step 2 failed, pipeline terminated")
+            return False
+
+        coverage = run_stage("coverage", run_dir, manifest,
+                             {"dilation": args.dilation, "out_of_core": args.out_of_core},
+                             [sampling["samples"], vd_extraction["vd"]],
+                             lambda: run_coverage_matrix(sampling["samples"], vd_extraction["vd"],
+                                                         coverage_output_dir, args.dilation, args.out_of_core))
+        if coverage is None:
+            print("Step 2 failed, pipeline terminated")
+            return False
+
+        selection = run_stage("selection", run_dir, manifest,
+                              {"max_iter": args.max_iter, "batch_size": args.batch_size, "solver": args.solver,
+                               "target_coverage": args.target_coverage, "time_budget": args.time_budget,
+                               "local_search": args.local_search},
+                              [coverage["coverage_matrix"], coverage["candidates"], coverage["radius"]],
+                              lambda: run_selection(coverage, coverage_output_dir, args.max_iter,
+                                                    args.batch_size, args.compare_batch, args.solver,
+                                                    args.target_coverage, args.time_budget,
+                                                    resume=args.resume is not None,
+                                                    out_of_core_mode=args.out_of_core,
+                                                    post_optimize=args.local_search),
+                              state_files=[os.path.join(coverage_output_dir, SELECTION_CHECKPOINT)])
+        if selection is None:
             print("Step 2 failed, pipeline terminated")
             return False
         
-        success, selected_points_file = coverage_result
+        selected_points_file = selection["selected_points_for_qmat"]
         results["Selected points file"] = selected_points_file
         
         # Check if selected points file exists
@@ -396,16 +623,39 @@ def main():
             print(f"Error: Selected points file not found: {selected_points_file}")
             return False
         
-        # Step 3: Use QMAT for simplification with selected poles
-        success, final_obj, final_ma = run_qmat_step2(args.qmat, args.mesh, args.ma, 
-                                                     args.vertices, selected_points_file, 
-                                                     final_output_dir + "/")
-        if not success:
+        # Step 3: Use QMAT (or the native connection) for simplification with selected poles
+        def qmat_step2_stage():
+            success, final_obj, final_ma = run_qmat_step2(args.qmat, args.mesh, args.ma,
+                                                         args.vertices, selected_points_file,
+                                                         final_output_dir + "/")
+            if not success:
+                return None
+            outputs = {}
+            if final_obj:
+                outputs["final_obj"] = final_obj
+            if final_ma:
+                outputs["final_ma"] = final_ma
+            return outputs
+
+        def native_connection_stage():
+            success, final_obj, final_ma = run_native_connection(
+                source_ma_file, np.load(selection["selected_indices"]), final_output_dir)
+            if not success:
+                return None
+            return {"final_obj": final_obj, "final_ma": final_ma}
+
+        if args.connect == 'native':
+            step2 = run_stage("native_connection", run_dir, manifest, {},
+                              [source_ma_file, selection["selected_indices"]], native_connection_stage)
+        else:
+            step2 = run_stage("qmat_step2", run_dir, manifest, {"vertices": args.vertices},
+                              [args.mesh, args.ma, args.qmat, selected_points_file], qmat_step2_stage)
+        if step2 is None:
             print("Step 3 failed, pipeline terminated")
             return False
         
-        results["Final simplified MA (OBJ)"] = final_obj
-        results["Final simplified MA (MA)"] = final_ma
+        results["Final simplified MA (OBJ)"] = step2.get("final_obj")
+        results["Final simplified MA (MA)"] = step2.get("final_ma")
         
         # Save run information
         save_run_info(run_dir, args, results)
@@ -418,6 +668,7 @@ def main():
         print(f"├── coverage_axis_output/     # CoverageAxis intermediate results")
         print(f"├── qmat_temp/               # QMAT step 1 temporary files")
         print(f"├── final_output/            # Final output files")
+        print(f"├── stages.json              # Stage fingerprints used by --resume")
         print(f"└── run_info.txt             # Run information record")
         print("="*60)
         
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Out-of-core Coverage Axis for high-resolution meshes
+The candidate points P, their winding numbers, the inner points, the radii and
+the coverage matrix D live in .npy memory-mapped files of the run directory
+(np.load(path, mmap_mode='r') opens them again). Every stage reads and writes
+them tile by tile, so the working set is a fixed number of tiles whatever the
+number of candidates.
+"""
+
+import os
+import sys
+import argparse
+from pathlib import Path
+from datetime import datetime
+
+import numpy as np
+import torch
+import trimesh
+from tqdm import tqdm
+from numpy.lib.format import open_memmap
+
+from utils import save_obj, save_txt, winding_number_fused, winding_number_face_data, sample_surface
+from coverage_solver import heuristic_alg, save_progressive
+from inside_test import default_device, load_occupancy_grid, occupancy_winding_number, load_proxy_mesh, \
+    proxy_winding_number
+
+
+def sample_inner_candidates(mesh_vertices, mesh_faces, sample_number, output_dir, tile_size=5000,
+                            seed=None, device=None, inside_test='occupancy'):
+    """Random candidates inside the mesh, as in Coverage_Axis_mesh.py, computed tile by tile
+
+    P (sample_number, 3) and its winding numbers are written to P.npy and
+    winding.npy, the inner points to inner_points.npy (all memory-mapped).
+    With inside_test='occupancy' the winding numbers are exact near the surface
+    only (1 / 0 elsewhere, see inside_test.py), with 'proxy' they are computed on
+    a coarse proxy mesh away from the surface; 'winding' computes all of them.
+    Returns the memory-mapped inner points.
+    """
+    device = device or default_device()
+    rng = np.random.default_rng(seed)
+    min_xyz = np.min(mesh_vertices, axis=0)
+    max_xyz = np.max(mesh_vertices, axis=0)
+    verts_g = torch.tensor(mesh_vertices, device=device).double()
+    faces_g = torch.tensor(mesh_faces, device=device).long()
+    face_data = winding_number_face_data(verts_g, faces_g)
+    grid = load_occupancy_grid(mesh_vertices, mesh_faces, device=device) if inside_test == 'occupancy' else None
+    proxy = load_proxy_mesh(mesh_vertices, mesh_faces) if inside_test == 'proxy' else None
+
+    P = open_memmap(os.path.join(output_dir, "P.npy"), mode='w+', dtype=np.float64, shape=(sample_number, 3))
+    winding = open_memmap(os.path.join(output_dir, "winding.npy"), mode='w+', dtype=np.float64,
+                          shape=(sample_number,))
+    for start in tqdm(range(0, sample_number, tile_size)):
+        end = min(start + tile_size, sample_number)
+        # same bounding box sampling as the mesh scripts
+        P[start:end] = max_xyz * rng.random((end - start, 3)) * 1.3 + min_xyz - 0.1
+        if grid is not None:
+            winding[start:end] = occupancy_winding_number(P[start:end], mesh_vertices, mesh_faces, grid=grid,
+                                                          device=device)
+        elif proxy is not None:
+            winding[start:end] = proxy_winding_number(P[start:end], mesh_vertices, mesh_faces, proxy=proxy,
+                                                      device=device)
+        else:
+            pts_g = torch.tensor(P[start:end], device=device).double()
+            winding[start:end] = winding_number_fused(pts_g, verts_g, faces_g, face_data).cpu().numpy()
+    P.flush()
+    winding.flush()
+
+    inside_count = 0
+    for start in range(0, sample_number, tile_size):
+        inside_count += int(np.count_nonzero(winding[start:start + tile_size] > 0.5))
+    inner_points = open_memmap(os.path.join(output_dir, "inner_points.npy"), mode='w+', dtype=np.float64,
+                               shape=(inside_count, 3))
+    offset = 0
+    for start in range(0, sample_number, tile_size):
+        tile = P[start:start + tile_size][winding[start:start + tile_size] > 0.5]
+        inner_points[offset:offset + len(tile)] = tile
+        offset += len(tile)
+    inner_points.flush()
+    print("The number of sampled inner candidates: ", inside_count)
+    return inner_points
+
+
+def nearest_sample_radius(inner_points, point_set, output_path, tile_size=5000, device=None):
+    """Distance of every inner point to its nearest surface sample, shape (n, 1) as in the mesh scripts"""
+    device = device or default_device()
+    point_set_g = torch.tensor(point_set, device=device).double()
+    radius = open_memmap(output_path, mode='w+', dtype=np.float64, shape=(len(inner_points), 1))
+    for start in tqdm(range(0, len(inner_points), tile_size)):
+        end = min(start + tile_size, len(inner_points))
+        inner_g = torch.tensor(np.asarray(inner_points[start:end]), device=device).double()
+        dist = torch.cdist(inner_g, point_set_g, p=2)
+        radius[start:end] = dist.topk(1, largest=False).values.cpu().numpy()
+    radius.flush()
+    return radius
+
+
+def coverage_matrix(point_set, inner_points, radius, dilation, output_path, tile_size=5000, device=None):
+    """Coverage matrix D (samples x candidates, int8) of the dilated spheres, computed by candidate tiles"""
+    device = device or default_device()
+    point_set_g = torch.tensor(point_set, device=device).double()
+    D = open_memmap(output_path, mode='w+', dtype=np.int8, shape=(len(point_set), len(inner_points)))
+    for start in tqdm(range(0, len(inner_points), tile_size)):
+        end = min(start + tile_size, len(inner_points))
+        inner_g = torch.tensor(np.asarray(inner_points[start:end]), device=device).double()
+        radius_g = torch.tensor(np.reshape(radius[start:end], -1), device=device).double() + dilation
+        dist = torch.cdist(point_set_g, inner_g, p=2)
+        D[:, start:end] = torch.gt(radius_g.unsqueeze(0), dist).cpu().numpy().astype(np.int8)
+    D.flush()
+    return D
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Out-of-core Coverage Axis++ with random inner candidates')
+    parser.add_argument('--mesh', required=True, help='Input mesh file path (.off)')
+    parser.add_argument('--candidates', type=int, default=500000, help='Random candidates in the bounding box')
+    parser.add_argument('--samples', type=int, default=1500, help='Surface sampling points (default: 1500)')
+    parser.add_argument('--sampling', choices=['random', 'blue_noise'], default='random',
+                        help='Surface sampling method (default: random)')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed')
+    parser.add_argument('--dilation', type=float, default=0.02, help='Dilation parameter (default: 0.02)')
+    parser.add_argument('--max-iter', type=int, default=50, help='Maximum number of selected spheres')
+    parser.add_argument('--inside-test', choices=['occupancy', 'proxy', 'winding'], default='occupancy',
+                        help='Inside test of the candidates: cached voxel occupancy grid with exact winding numbers '
+                             'near the surface, cached proxy mesh with exact winding numbers near the surface, '
+                             'or winding numbers everywhere (default: occupancy)')
+    parser.add_argument('--tile-size', type=int, default=5000, help='Candidates per tile (default: 5000)')
+    parser.add_argument('--runs-dir', default='./runs', help='Run directory root (default: ./runs)')
+    args = parser.parse_args()
+
+    run_dir = os.path.join(args.runs_dir, f"{Path(args.mesh).stem}_ooc_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    os.makedirs(run_dir, exist_ok=True)
+    print(f"Created run directory: {run_dir}")
+
+    mesh = trimesh.load(args.mesh)
+    mesh_faces = np.array(mesh.faces)
+    mesh_vertices = np.array(mesh.vertices)
+    point_set = np.array(sample_surface(mesh, args.samples, method=args.sampling, seed=args.seed)[0])
+    print("The number of surface samples: ", len(point_set))
+
+    inner_points = sample_inner_candidates(mesh_vertices, mesh_faces, args.candidates, run_dir,
+                                           args.tile_size, args.seed, inside_test=args.inside_test)
+    radius_ori = nearest_sample_radius(inner_points, point_set, os.path.join(run_dir, "radius.npy"), args.tile_size)
+    D = coverage_matrix(point_set, inner_points, radius_ori, args.dilation, os.path.join(run_dir, "D.npy"),
+                        args.tile_size)
+
+    save_obj(os.path.join(run_dir, "mesh.obj"), mesh_vertices, mesh_faces)
+    save_obj(os.path.join(run_dir, "mesh_samples_%d.obj" % len(point_set)), point_set)
+
+    value_pos, grade, coverage_rate = heuristic_alg(D, inner_points, np.reshape(radius_ori, -1), reg_radius=1, reg=1,
+                                                    max_iter=args.max_iter, penalty='')
+    print("Coverage rate: ", 100 * (1 - coverage_rate), "%")
+    print("The number of selected inner points: ", len(value_pos))
+    save_obj(os.path.join(run_dir, "mesh_selected_inner_points.obj"), inner_points[value_pos])
+    save_txt(os.path.join(run_dir, "mesh_selected_inner_points.txt"),
+             np.concatenate((inner_points[value_pos], radius_ori[value_pos]), axis=1))
+    save_progressive(os.path.join(run_dir, "mesh_selected_inner_points_progressive.npz"), D, value_pos,
+                     inner_points[value_pos], radius_ori[value_pos])
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Temporally coherent Coverage Axis for animated mesh sequences
+The meshes of a sequence share their topology (e.g. LBS-deformed frames), so
+the surface samples and the candidates of the first frame are carried forward
+instead of being computed again:
+- a surface sample is a face and barycentric coordinates on it;
+- a candidate is anchored to its nearest surface sample, as an offset in the
+  local frame (edge, bitangent, normal) of the anchor face.
+For every next frame, only the candidates that moved beyond a threshold are
+tested for being inside again, and only the coverage columns of the candidates
+whose position, radius or covered samples changed are computed again. Motions
+are measured from the positions and radii at the last recompute of every
+column and sample, so a slow drift is caught once it adds up. The
+previous selection warm-starts the greedy, which repairs the cover locally,
+then local search removes the spheres made redundant by the motion.
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import scipy.sparse as sp
+import trimesh
+from scipy.spatial import cKDTree
+
+from utils import save_obj, save_txt, sample_surface
+from coverage_solver import heuristic_alg, local_search, importance_order, write_progressive
+from dilation_sweep import build_sorted_coverage
+from inside_test import winding_number_chunked
+from adaptive_candidates import adaptive_candidates
+
+
+def barycentric(points, triangles):
+    """Barycentric coordinates (n, 3) of points in triangles (n, 3, 3)"""
+    v0 = triangles[:, 1] - triangles[:, 0]
+    v1 = triangles[:, 2] - triangles[:, 0]
+    v2 = points - triangles[:, 0]
+    d00 = np.einsum('ij,ij->i', v0, v0)
+    d01 = np.einsum('ij,ij->i', v0, v1)
+    d11 = np.einsum('ij,ij->i', v1, v1)
+    d20 = np.einsum('ij,ij->i', v2, v0)
+    d21 = np.einsum('ij,ij->i', v2, v1)
+    denom = np.maximum(d00 * d11 - d01 * d01, 1e-300)
+    b1 = (d11 * d20 - d01 * d21) / denom
+    b2 = (d00 * d21 - d01 * d20) / denom
+    return np.stack((1 - b1 - b2, b1, b2), axis=1)
+
+
+def face_frames(vertices, faces, face_index):
+    """Orthonormal local frames (n, 3, 3) of faces: rows are the first edge, the bitangent and the normal"""
+    tri = vertices[faces[face_index]]
+    t = tri[:, 1] - tri[:, 0]
+    n = np.cross(t, tri[:, 2] - tri[:, 0])
+    t /= np.maximum(np.linalg.norm(t, axis=1, keepdims=True), 1e-300)
+    n /= np.maximum(np.linalg.norm(n, axis=1, keepdims=True), 1e-300)
+    return np.stack((t, np.cross(n, t), n), axis=1)
+
+
+def sample_positions(vertices, faces, sample_faces, sample_bary):
+    """Positions of surface samples given by faces and barycentric coordinates"""
+    return np.einsum('ij,ijk->ik', sample_bary, vertices[faces[sample_faces]])
+
+
+def anchor_candidates(candidates, samples, sample_faces, vertices, faces):
+    """Anchor sample and local offset (coordinates in the anchor face frame) of every candidate"""
+    anchor = cKDTree(samples).query(candidates, k=1)[1]
+    frames = face_frames(vertices, faces, sample_faces[anchor])
+    offset = np.einsum('ikj,ij->ik', frames, candidates - samples[anchor])
+    return anchor, offset
+
+
+def transport_candidates(anchor, offset, samples, sample_faces, vertices, faces):
+    """Candidate positions for new sample positions and vertices"""
+    frames = face_frames(vertices, faces, sample_faces[anchor])
+    return samples[anchor] + np.einsum('ikj,ik->ij', frames, offset)
+
+
+def coverage_pairs(samples, candidates, radius, columns, dilation):
+    """(rows, cols) of the coverage pairs of the given candidate columns"""
+    sc = build_sorted_coverage(samples, candidates[columns], radius[columns], dilation)
+    keep = sc["slack"] < dilation
+    return sc["rows"][keep], columns[sc["cols"][keep]]
+
+
+def sequence_coverage_axis(meshes, candidates=None, sample_number=2000, dilation=0.02, move_threshold=None,
+                           max_iter=1000, seed=None, post_optimize=True):
+    """Coverage Axis on every frame of a mesh sequence with shared topology
+
+    Parameters
+    ----------
+    meshes         : list of trimesh meshes with the same faces
+    candidates     : (n, 3) inner candidates of the first frame (default: adaptive_candidates)
+    move_threshold : displacement below which a sample or a candidate is considered
+                     static (default: 1e-3 of the bounding box diagonal of the first frame)
+    Returns
+    -------
+    list of dicts per frame with the selected candidates, their centers and radii,
+    the coverage (computed exactly for the selected spheres), the surface
+    samples, the importance order of the selection with its prefix coverage
+    (see importance_order), the number of recomputed coverage columns and the
+    fraction of the selection kept from the previous frame.
+    """
+    faces = np.array(meshes[0].faces)
+    vertices = np.array(meshes[0].vertices)
+    if move_threshold is None:
+        move_threshold = 1e-3 * np.linalg.norm(np.max(vertices, axis=0) - np.min(vertices, axis=0))
+    samples, sample_faces = sample_surface(meshes[0], sample_number, seed=seed)
+    samples, sample_faces = np.array(samples), np.array(sample_faces)
+    sample_bary = barycentric(samples, vertices[faces[sample_faces]])
+    if candidates is None:
+        candidates = adaptive_candidates(meshes[0], seed=seed)
+    candidates = np.asarray(candidates, dtype=np.float64)
+    anchor, offset = anchor_candidates(candidates, samples, sample_faces, vertices, faces)
+    valid = np.ones(len(candidates), dtype=bool)
+
+    frames = []
+    previous = None
+    for t, mesh in enumerate(meshes):
+        start = time.time()
+        vertices = np.array(mesh.vertices)
+        if len(vertices) != len(meshes[0].vertices) or not np.array_equal(np.array(mesh.faces), faces):
+            raise ValueError("Frame %d does not share the topology of the first frame" % t)
+        samples = sample_positions(vertices, faces, sample_faces, sample_bary)
+        candidates = transport_candidates(anchor, offset, samples, sample_faces, vertices, faces)
+        radius = cKDTree(samples).query(candidates, k=1)[0]
+
+        if previous is None:
+            columns = np.arange(len(candidates))
+            # positions and radii at the last recompute of every column and sample
+            reference = {"candidates": candidates.copy(), "radius": radius.copy(), "samples": samples.copy()}
+        else:
+            moved = np.linalg.norm(candidates - reference["candidates"], axis=1) > move_threshold
+            if np.any(moved):
+                valid[moved] = winding_number_chunked(candidates[moved], vertices, faces) > 0.5
+            affected = moved | (np.abs(radius - reference["radius"]) > move_threshold)
+            moved_samples = np.nonzero(np.linalg.norm(samples - reference["samples"], axis=1) > move_threshold)[0]
+            if len(moved_samples) > 0:
+                # candidates that covered a moved sample, or may cover it now
+                affected[previous["cols"][np.isin(previous["rows"], moved_samples)]] = True
+                reach = np.max(radius) + dilation
+                for nb in cKDTree(candidates).query_ball_point(samples[moved_samples], reach, return_sorted=False):
+                    affected[nb] = True
+            columns = np.nonzero(affected)[0]
+            # every pair of a moved sample is computed again (the candidates out of reach cover it neither way)
+            reference["candidates"][columns] = candidates[columns]
+            reference["radius"][columns] = radius[columns]
+            reference["samples"][moved_samples] = samples[moved_samples]
+        columns = columns[valid[columns]]
+        rows, cols = coverage_pairs(samples, candidates, radius, columns, dilation)
+        if previous is not None:
+            keep = ~np.isin(previous["cols"], columns) & valid[previous["cols"]]
+            rows = np.concatenate((previous["rows"][keep], rows))
+            cols = np.concatenate((previous["cols"][keep], cols))
+
+        D = sp.csr_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(len(samples), len(candidates)))
+        warm_start = None if previous is None else previous["selected"]
+        value_pos, _, _ = heuristic_alg(D, candidates, radius, reg_radius=1, reg=1, max_iter=max_iter,
+                                        penalty='', warm_start=warm_start)
+        if post_optimize:
+            value_pos = local_search(D, value_pos)
+        # the pairs of the columns kept from earlier frames are within the move threshold,
+        # the coverage of the selection is computed on the current positions
+        sel_rows, sel_cols = coverage_pairs(samples, candidates, radius, value_pos, dilation)
+        D_sel = sp.csr_matrix((np.ones(len(sel_rows), dtype=np.int8), (sel_rows, sel_cols)), shape=D.shape)
+        covered = np.asarray(D_sel.sum(axis=1)).reshape(-1) > 0
+        order, prefix_coverage = importance_order(D_sel, value_pos)
+        kept = 0.0 if previous is None else len(np.intersect1d(value_pos, previous["selected"])) / max(len(value_pos), 1)
+
+        frame = {
+            "frame": t,
+            "selected": value_pos,
+            "centers": candidates[value_pos],
+            "radius": radius[value_pos],
+            "coverage": float(np.mean(covered)),
+            "samples": samples,
+            "order": order,
+            "prefix_coverage": prefix_coverage,
+            "recomputed_columns": len(columns),
+            "kept": kept,
+            "time": time.time() - start,
+        }
+        print(f"Frame {t}: {len(value_pos)} spheres, coverage {100 * frame['coverage']:.2f}%, "
+              f"{len(columns)}/{len(candidates)} columns recomputed, {100 * kept:.1f}% kept, {frame['time']:.2f}s")
+        frames.append(frame)
+        previous = {"rows": rows, "cols": cols, "selected": value_pos}
+    return frames
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Temporally coherent Coverage Axis for a mesh sequence')
+    parser.add_argument('--meshes', nargs='+', required=True, help='Mesh files of the frames, in order (same topology)')
+    parser.add_argument('--candidates', default=None,
+                        help='Inner candidates of the first frame (.obj); default: adaptive candidates')
+    parser.add_argument('--samples', type=int, default=2000, help='Surface sampling points (default: 2000)')
+    parser.add_argument('--dilation', type=float, default=0.02, help='Dilation parameter (default: 0.02)')
+    parser.add_argument('--move-threshold', type=float, default=None,
+                        help='Displacement below which samples and candidates are static '
+                             '(default: 1e-3 of the bounding box diagonal)')
+    parser.add_argument('--max-iter', type=int, default=1000, help='Maximum number of spheres per frame')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed')
+    parser.add_argument('--output-dir', default='./output/sequence', help='Output directory')
+    args = parser.parse_args()
+
+    meshes = [trimesh.load(path, process=False) for path in args.meshes]
+    candidates = None if args.candidates is None else np.array(trimesh.load(args.candidates).vertices)
+    frames = sequence_coverage_axis(meshes, candidates, args.samples, args.dilation, args.move_threshold,
+                                    args.max_iter, args.seed)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    with open(os.path.join(args.output_dir, "sequence.txt"), 'w') as f:
+        f.write('frame num_spheres coverage recomputed_columns kept time\n')
+        for frame in frames:
+            frame_dir = os.path.join(args.output_dir, "frame_%03d" % frame["frame"])
+            os.makedirs(frame_dir, exist_ok=True)
+            save_obj(os.path.join(frame_dir, "mesh_selected_inner_points.obj"), frame["centers"])
+            save_txt(os.path.join(frame_dir, "mesh_selected_inner_points.txt"),
+                     np.concatenate((frame["centers"], frame["radius"][:, None]), axis=1))
+            write_progressive(os.path.join(frame_dir, "mesh_selected_inner_points_progressive.npz"),
+                              frame["centers"], frame["radius"], frame["order"], frame["prefix_coverage"])
+            f.write('%d %d %f %d %f %f\n' % (frame["frame"], len(frame["selected"]), frame["coverage"],
+                                             frame["recomputed_columns"], frame["kept"], frame["time"]))
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
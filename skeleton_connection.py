@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Native skeleton connection of the selected inner points
+An in-process alternative to QMAT step 2: the selected points are vertices of
+the medial mesh (.ma) the candidates were extracted from. Every medial vertex
+is assigned to its geodesically nearest selected vertex (multi-source Dijkstra
+over the sparse adjacency graph of the medial mesh), which partitions the
+medial mesh into Voronoi regions. Collapsing every region onto its selected
+vertex turns the medial edges and faces crossing regions into the edges and
+faces of the connected skeleton.
+"""
+
+import os
+import sys
+import argparse
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import cKDTree
+
+
+def read_ma(path):
+    """Read a .ma file: vertices (n, 3), radii (n,), edges (e, 2) and faces (f, 3), 0-based"""
+    vertices, radius, edges, faces = [], [], [], []
+    with open(path, 'r') as f:
+        lines = f.readlines()
+    # Skip first line (numbers of vertices, edges and faces)
+    for line in lines[1:]:
+        parts = line.split()
+        if len(parts) == 0:
+            continue
+        if parts[0] == 'v' and len(parts) >= 4:
+            vertices.append([float(parts[1]), float(parts[2]), float(parts[3])])
+            radius.append(float(parts[4]) if len(parts) >= 5 else 0.1)
+        elif parts[0] == 'e' and len(parts) >= 3:
+            edges.append([int(parts[1]), int(parts[2])])
+        elif parts[0] == 'f' and len(parts) >= 4:
+            faces.append([int(parts[1]), int(parts[2]), int(parts[3])])
+    return (np.array(vertices, dtype=np.float64).reshape(-1, 3), np.array(radius, dtype=np.float64),
+            np.array(edges, dtype=np.int64).reshape(-1, 2), np.array(faces, dtype=np.int64).reshape(-1, 3))
+
+
+def medial_graph(vertices, edges, faces):
+    """Sparse adjacency graph of the medial mesh (edges and face sides), weighted by edge length"""
+    pairs = np.concatenate((edges, faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]), axis=0)
+    pairs = np.sort(pairs, axis=1)
+    pairs = np.unique(pairs[pairs[:, 0] != pairs[:, 1]], axis=0)
+    length = np.linalg.norm(vertices[pairs[:, 0]] - vertices[pairs[:, 1]], axis=1)
+    # zero weights would be dropped from the sparse matrix
+    length = np.maximum(length, 1e-12)
+    n = len(vertices)
+    return sp.csr_matrix((length, (pairs[:, 0], pairs[:, 1])), shape=(n, n))
+
+
+def connect_skeleton(vertices, radius, edges, faces, selected):
+    """Connect the selected medial vertices into a skeleton
+
+    Parameters
+    ----------
+    vertices, radius, edges, faces : medial mesh, as returned by read_ma
+    selected : indices of the selected medial vertices
+    Returns
+    -------
+    skeleton vertices (k, 3), radii (k,), edges (e, 2) and faces (f, 3), indexing
+    the selected vertices in the order given (duplicates removed).
+    """
+    selected = np.asarray(selected, dtype=np.int64)
+    _, first = np.unique(selected, return_index=True)
+    selected = selected[np.sort(first)]
+    graph = medial_graph(vertices, edges, faces)
+    _, _, sources = dijkstra(graph, directed=False, indices=selected, min_only=True, return_predecessors=True)
+
+    # region label of every medial vertex = index of its selected vertex (-1 if unreachable)
+    label = np.full(len(vertices), -1, dtype=np.int64)
+    reached = sources >= 0
+    position = np.full(len(vertices), -1, dtype=np.int64)
+    position[selected] = np.arange(len(selected))
+    label[reached] = position[sources[reached]]
+
+    # faces crossing three regions become skeleton faces
+    face_labels = np.sort(label[faces], axis=1) if len(faces) > 0 else np.zeros((0, 3), dtype=np.int64)
+    valid = np.all(face_labels >= 0, axis=1)
+    face_labels = face_labels[valid]
+    distinct = (face_labels[:, 0] != face_labels[:, 1]) & (face_labels[:, 1] != face_labels[:, 2])
+    skeleton_faces = np.unique(face_labels[distinct], axis=0) if np.any(distinct) else np.zeros((0, 3), dtype=np.int64)
+
+    # edges (and face sides) crossing two regions become skeleton edges
+    pairs = np.concatenate((edges, faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]), axis=0)
+    pair_labels = np.sort(label[pairs], axis=1)
+    keep = (pair_labels[:, 0] >= 0) & (pair_labels[:, 0] != pair_labels[:, 1])
+    skeleton_edges = np.unique(pair_labels[keep], axis=0) if np.any(keep) else np.zeros((0, 2), dtype=np.int64)
+
+    return vertices[selected], radius[selected], skeleton_edges, skeleton_faces
+
+
+def match_selected_points(vertices, points):
+    """Indices of the medial vertices nearest to the given points (e.g. read from a selected points file)"""
+    return cKDTree(vertices).query(np.asarray(points)[:, :3], k=1)[1]
+
+
+def save_skeleton(output_dir, vertices, radius, edges, faces):
+    """Save the skeleton as QMAT does: sim_MA___v_X___e_Y___f_Z.obj and export_half___v_X___e_Y___f_Z.ma"""
+    os.makedirs(output_dir, exist_ok=True)
+    suffix = "v_%d___e_%d___f_%d" % (len(vertices), len(edges), len(faces))
+    obj_file = os.path.join(output_dir, "sim_MA___%s.obj" % suffix)
+    ma_file = os.path.join(output_dir, "export_half___%s.ma" % suffix)
+    with open(obj_file, 'w') as f:
+        for v in vertices:
+            f.write('v %f %f %f\n' % (v[0], v[1], v[2]))
+        for e in edges:
+            f.write('l %d %d\n' % (e[0] + 1, e[1] + 1))
+        for ff in faces:
+            f.write('f %d %d %d\n' % (ff[0] + 1, ff[1] + 1, ff[2] + 1))
+    with open(ma_file, 'w') as f:
+        f.write('%d %d %d\n' % (len(vertices), len(edges), len(faces)))
+        for v, r in zip(vertices, radius):
+            f.write('v %f %f %f %f\n' % (v[0], v[1], v[2], r))
+        for e in edges:
+            f.write('e %d %d\n' % (e[0], e[1]))
+        for ff in faces:
+            f.write('f %d %d %d\n' % (ff[0], ff[1], ff[2]))
+    return obj_file, ma_file
+
+
+def run_native_connection(ma_path, selected, output_dir):
+    """Connect the selected medial vertices (indices into ma_path) and save the skeleton"""
+    print("Step 3: Connecting the selected poles into a skeleton (native)...")
+    vertices, radius, edges, faces = read_ma(ma_path)
+    skeleton = connect_skeleton(vertices, radius, edges, faces, selected)
+    obj_file, ma_file = save_skeleton(output_dir, *skeleton)
+    print(f"Skeleton: {len(skeleton[0])} vertices, {len(skeleton[2])} edges, {len(skeleton[3])} faces")
+    print(f"- Simplified MA (OBJ): {obj_file}")
+    print(f"- Simplified MA (MA): {ma_file}")
+    return True, obj_file, ma_file
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description='Connect selected inner points into a skeleton without QMAT')
+    parser.add_argument('--ma', required=True, help='Medial mesh the candidates were extracted from (.ma)')
+    parser.add_argument('--selected', required=True,
+                        help='Selected points (v x y z r per line, e.g. mesh_selected_inner_points.txt)')
+    parser.add_argument('--output-dir', default='./final_output/', help='Output directory')
+    args = parser.parse_args()
+
+    vertices, _, _, _ = read_ma(args.ma)
+    points = []
+    with open(args.selected, 'r') as f:
+        for line in f.readlines():
+            parts = line.split()
+            if len(parts) >= 4 and parts[0] == 'v':
+                points.append([float(parts[1]), float(parts[2]), float(parts[3])])
+    selected = match_selected_points(vertices, np.array(points))
+    success, _, _ = run_native_connection(args.ma, selected, args.output_dir)
+    return success
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+import trimesh
+
+# the modules are flat scripts at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def sphere_mesh():
+    """Unit icosphere (320 faces)"""
+    return trimesh.creation.icosphere(subdivisions=2)
+
+
+@pytest.fixture
+def ball_candidates():
+    """Random candidates inside the unit ball"""
+    rng = np.random.default_rng(0)
+    points = rng.uniform(-1, 1, size=(3000, 3))
+    return points[np.linalg.norm(points, axis=1) < 0.9]
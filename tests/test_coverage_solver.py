@@ -0,0 +1,128 @@
+import numpy as np
+import scipy.sparse as sp
+
+from coverage_solver import solve_coverage, covered_rate, heuristic_alg, local_search, importance_order, \
+    save_progressive, load_progressive, iter_solutions, select_disjoint_batch, compare_batch_selection
+
+
+def random_problem(m=300, n=200, density=0.03, seed=0):
+    """Random coverage problem where every sample is coverable"""
+    rng = np.random.default_rng(seed)
+    D = rng.random((m, n)) < density
+    D[np.arange(m), rng.integers(0, n, m)] = True
+    return D.astype(np.int8), rng.normal(size=(n, 3)), rng.uniform(0.5, 1.5, n)
+
+
+def test_resume_respects_a_lower_sphere_cap(tmp_path):
+    D, candidate, radius = random_problem()
+    checkpoint = str(tmp_path / "checkpoint.npz")
+    full = solve_coverage(D, candidate, radius, max_spheres=1000, checkpoint=checkpoint, penalty='')
+    assert full["num_spheres"] > 20
+
+    capped = solve_coverage(D, candidate, radius, max_spheres=20, checkpoint=checkpoint, penalty='')
+    assert capped["num_spheres"] == 20
+    assert np.array_equal(capped["selected"], full["selected"][:20])
+    assert np.isclose(capped["coverage"], covered_rate(D, capped["selected"]))
+
+
+def test_local_search_keeps_the_coverage():
+    D, candidate, radius = random_problem(seed=1)
+    greedy = heuristic_alg(D, candidate, radius, max_iter=1000, penalty='')[0]
+    # redundant spheres on top of the greedy cover
+    selected = np.concatenate((greedy, np.arange(0, 200, 7), greedy[:5]))
+    improved = local_search(sp.csr_matrix(D), selected)
+    assert len(improved) == len(np.unique(improved))
+    assert len(improved) < len(np.unique(selected))
+    assert covered_rate(D, improved) == covered_rate(D, selected) == 1.0
+
+
+def test_local_search_returns_no_duplicates():
+    for seed in range(20):
+        rng = np.random.default_rng(seed)
+        # partial covers, where swaps can bring back a sphere removed earlier in the pass
+        D = (rng.random((60, 60)) < 0.08).astype(np.int8)
+        selected = rng.choice(60, 42, replace=False)
+        out = local_search(D, selected)
+        assert len(set(out)) == len(out)
+        assert len(out) <= len(selected)
+        assert covered_rate(D, out) >= covered_rate(D, selected)
+
+
+def test_heuristic_dense_and_sparse_select_the_same():
+    D, candidate, radius = random_problem(seed=2)
+    dense = heuristic_alg(D, candidate, radius, max_iter=1000)
+    sparse = heuristic_alg(sp.csr_matrix(D), candidate, radius, max_iter=1000)
+    assert np.array_equal(dense[0], sparse[0])
+    assert dense[2] == sparse[2] == 0
+
+
+
+def test_greedy_stops_at_uncoverable_samples():
+    D, candidate, radius = random_problem(seed=5)
+    D[7] = 0  # a sample no candidate covers
+    for matrix in (D, sp.csr_matrix(D)):
+        A, _, uncovered = heuristic_alg(matrix, candidate, radius, max_iter=100)
+        assert len(A) == len(np.unique(A)) < 100
+        assert np.isclose(uncovered, 1 / len(D))
+    best = solve_coverage(D, candidate, radius, max_spheres=100, target_coverage=1.0)
+    assert best["num_spheres"] == len(np.unique(best["selected"])) < 100
+    assert np.isclose(best["coverage"], 1 - 1 / len(D))
+
+def test_warm_start():
+    D, candidate, radius = random_problem(seed=3)
+    cold = heuristic_alg(D, candidate, radius, max_iter=1000, penalty='')[0]
+    # a complete cover is kept as it is, a repeated sphere covers nothing new and is skipped
+    warm = heuristic_alg(D, candidate, radius, max_iter=1000, penalty='', warm_start=list(cold) + [cold[0]])[0]
+    assert np.array_equal(warm, cold)
+    # a partial cover is completed after its spheres
+    partial = heuristic_alg(D, candidate, radius, max_iter=1000, penalty='', warm_start=cold[:10])
+    assert np.array_equal(partial[0][:10], cold[:10])
+    assert partial[2] == 0
+
+
+
+def test_disjoint_batch_selection():
+    D, candidate, radius = random_problem(seed=6)
+    S = np.arange(0, len(D), 2)  # the odd samples are covered already
+    score = np.random.default_rng(6).normal(size=D.shape[1])
+    for matrix in (D, sp.csr_matrix(D)):
+        picks, covered = select_disjoint_batch(matrix, S, score, 8)
+        assert picks[0] == np.argmax(score) and 1 < len(picks) <= 8
+        # every uncovered sample is covered by at most one pick of the batch
+        hits = D[S][:, picks].sum(axis=1)
+        assert hits.max() == 1
+        assert np.array_equal(covered, hits > 0)
+
+
+def test_batched_greedy_needs_fewer_passes():
+    D, candidate, radius = random_problem(seed=0)
+    passes = {}
+    for k in (1, 4):
+        solutions = list(iter_solutions(D, candidate, radius, batch_size=k))
+        passes[k] = len(solutions)
+        assert solutions[-1]["coverage"] == 1.0 == covered_rate(D, solutions[-1]["selected"])
+    assert passes[4] < passes[1] / 2
+    report = compare_batch_selection(D, candidate, radius, 4)
+    assert report["greedy"]["coverage"] == report["batch"]["coverage"] == 1.0
+    assert report["greedy"]["num_spheres"] == passes[1]
+    assert abs(report["delta_spheres"]) <= 0.1 * report["greedy"]["num_spheres"]
+
+def test_importance_order_prefix_coverage(tmp_path):
+    D, candidate, radius = random_problem(seed=4)
+    selected = heuristic_alg(D, candidate, radius, max_iter=1000, penalty='')[0][::-1]
+    order, coverage = importance_order(sp.csr_matrix(D), selected)
+    assert np.array_equal(np.sort(order), np.arange(len(selected)))
+    assert np.all(np.diff(coverage) >= 0)
+    for k in (1, 5, len(selected)):
+        assert np.isclose(coverage[k - 1], covered_rate(D, selected[order[:k]]))
+    # the marginal gains never increase
+    gains = np.diff(np.concatenate(([0], coverage)))
+    assert np.all(np.diff(gains) <= 1e-12)
+
+    path = str(tmp_path / "progressive.npz")
+    save_progressive(path, D, selected, candidate[selected], radius[selected])
+    spheres, prefix = load_progressive(path, budget=5)
+    assert spheres.shape == (5, 4)
+    assert np.allclose(spheres[:, :3], candidate[selected[order[:5]]])
+    spheres, prefix = load_progressive(path, target_coverage=0.5)
+    assert prefix[-1] >= 0.5 and (len(prefix) == 1 or prefix[-2] < 0.5)
@@ -0,0 +1,20 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+from utils import sample_surface
+from dilation_sweep import dilation_sweep
+
+
+def test_uncoverable_samples_do_not_inflate_the_curve(sphere_mesh, ball_candidates):
+    point_set = np.array(sample_surface(sphere_mesh, 300, seed=0)[0])
+    # candidates on one side only: the samples of the other side are uncoverable
+    candidates = ball_candidates[ball_candidates[:, 0] < -0.3]
+    radius = cKDTree(point_set).query(candidates, k=1)[0]
+    curve = dilation_sweep(point_set, candidates, radius, [0.02, 0.05], max_iter=1000)
+
+    for entry in curve:
+        assert entry["uncoverable"] > 0.3
+        assert entry["num_spheres"] == len(np.unique(entry["selected"]))
+        assert entry["num_spheres"] < 0.5 * len(point_set)
+        assert np.isclose(entry["coverage_rate"], 1 - entry["uncoverable"])
+        assert np.isclose(entry["prefix_coverage"][-1], entry["coverage_rate"])
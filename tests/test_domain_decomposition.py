@@ -0,0 +1,27 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+from utils import sample_surface
+from dilation_sweep import build_sorted_coverage, coverage_matrix_at
+from domain_decomposition import decomposed_solve, partition_samples
+
+
+def test_partition_overlap():
+    points = np.random.default_rng(0).uniform(size=(2000, 3))
+    regions = partition_samples(points, 6, 0.0, seed=0)
+    assert sum(len(rows) for rows in regions) == len(points)
+    assert np.array_equal(np.sort(np.concatenate(regions)), np.arange(len(points)))
+    overlapping = partition_samples(points, 6, 0.1, seed=0)
+    assert sum(len(rows) for rows in overlapping) > len(points)
+    assert np.array_equal(np.unique(np.concatenate(overlapping)), np.arange(len(points)))
+
+
+def test_decomposed_solve_keeps_full_coverage(sphere_mesh, ball_candidates):
+    point_set = np.array(sample_surface(sphere_mesh, 600, seed=0)[0])
+    radius = cKDTree(point_set).query(ball_candidates, k=1)[0]
+    D = coverage_matrix_at(build_sorted_coverage(point_set, ball_candidates, radius, 0.05), 0.05)
+    coverable = np.mean(np.diff(D.indptr) > 0)
+    selected, report = decomposed_solve(D, point_set, ball_candidates, radius, regions=4, processes=2, seed=0)
+    assert len(selected) == len(np.unique(selected))
+    assert report["coverage"] == coverable
+    assert np.mean(np.asarray(D[:, selected].sum(axis=1)).reshape(-1) > 0) == coverable
@@ -0,0 +1,23 @@
+import numpy as np
+import scipy.sparse as sp
+
+from coverage_solver import heuristic_alg
+from hyperparameter_search import hyperparameter_search
+
+
+def test_parallel_results_match_serial_runs():
+    rng = np.random.default_rng(0)
+    D = rng.random((300, 200)) < 0.03
+    D[np.arange(300), rng.integers(0, 200, 300)] = True
+    D = sp.csr_matrix(D.astype(np.int8))
+    candidate, radius = rng.normal(size=(200, 3)), rng.uniform(0.5, 1.5, 200)
+    results, front = hyperparameter_search(D, candidate, radius, regs=(0, 1), reg_radii=(1,), penalties=('stand',),
+                                           processes=2)
+
+    assert len(results) == 2
+    for r in results:
+        A, _, coverage_rate = heuristic_alg(D, candidate, radius, reg_radius=r["reg_radius"], reg=r["reg"],
+                                            penalty=r["penalty"], progress=False)
+        assert np.array_equal(r["selected"], A)
+        assert np.isclose(r["coverage"], 1 - coverage_rate)
+    assert 0 < len(front) <= len(results)
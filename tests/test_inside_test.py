@@ -0,0 +1,44 @@
+import numpy as np
+import trimesh
+
+from inside_test import occupancy_winding_number, winding_number_chunked, build_occupancy_grid, INSIDE, OUTSIDE, \
+    load_proxy_mesh, near_proxy_deviation, proxy_winding_number
+
+
+def test_occupancy_classification_matches_exact(sphere_mesh, tmp_path):
+    V, F = np.array(sphere_mesh.vertices), np.array(sphere_mesh.faces)
+    points = np.random.default_rng(0).uniform(-1.4, 1.4, size=(5000, 3))
+    exact = winding_number_chunked(points, V, F) > 0.5
+    fast = occupancy_winding_number(points, V, F, resolution=32, cache_dir=str(tmp_path)) > 0.5
+    assert np.array_equal(fast, exact)
+    # the second call reads the cached grid
+    assert len(list(tmp_path.iterdir())) == 1
+    cached = occupancy_winding_number(points, V, F, resolution=32, cache_dir=str(tmp_path)) > 0.5
+    assert np.array_equal(cached, exact)
+
+
+def test_occupancy_grid_states():
+    box = trimesh.creation.box(extents=(2, 2, 2))
+    grid = build_occupancy_grid(np.array(box.vertices), np.array(box.faces), resolution=16)
+    state = grid["state"]
+    center = np.floor((np.zeros(3) - grid["origin"]) / grid["pitch"]).astype(int)
+    assert state[tuple(center)] == INSIDE
+    assert state[0, 0, 0] == OUTSIDE
+
+
+def test_proxy_classification_matches_exact(sphere_mesh, tmp_path):
+    V, F = np.array(sphere_mesh.vertices), np.array(sphere_mesh.faces)
+    points = np.random.default_rng(1).uniform(-1.4, 1.4, size=(5000, 3))
+    exact = winding_number_chunked(points, V, F)
+    # a very coarse proxy, most points differ from the mesh only through the near band
+    proxy = load_proxy_mesh(V, F, resolution=4, cache_dir=str(tmp_path))
+    assert len(proxy["faces"]) < len(F)
+    on_proxy = winding_number_chunked(points, proxy["vertices"], proxy["faces"])
+    near = near_proxy_deviation(proxy, points)
+    # the proxy winding number is exact outside the near band
+    assert np.allclose(on_proxy[~near], exact[~near], atol=1e-9)
+    assert 0 < np.mean(near) < 1
+
+    winding = proxy_winding_number(points, V, F, resolution=4, cache_dir=str(tmp_path))
+    assert np.array_equal(winding > 0.5, exact > 0.5)
+    assert len(list(tmp_path.iterdir())) == 1
@@ -0,0 +1,69 @@
+import os
+
+from integrated_qmat_coverage_axis import run_stage, load_stage_manifest, find_latest_run_directory, STAGE_MANIFEST
+
+
+def write_stage(path, text):
+    def stage():
+        with open(path, 'w') as f:
+            f.write(text)
+        return {"output": path}
+    return stage
+
+
+def test_changed_fingerprint_removes_state_files(tmp_path):
+    run_dir = str(tmp_path)
+    output = os.path.join(run_dir, "out.txt")
+    state = os.path.join(run_dir, "checkpoint.npz")
+    manifest = {}
+    run_stage("stage", run_dir, manifest, {"max_iter": 100}, [], write_stage(output, "a"), state_files=[state])
+    open(state, 'w').close()
+
+    run_stage("stage", run_dir, manifest, {"max_iter": 100}, [], write_stage(output, "b"), state_files=[state])
+    assert os.path.exists(state)
+    run_stage("stage", run_dir, manifest, {"max_iter": 50}, [], write_stage(output, "c"), state_files=[state])
+    assert not os.path.exists(state)
+
+
+def test_stage_reuse_and_invalidation(tmp_path):
+    run_dir = str(tmp_path)
+    source = os.path.join(run_dir, "input.txt")
+    output = os.path.join(run_dir, "out.txt")
+    with open(source, 'w') as f:
+        f.write("v1")
+    calls = []
+
+    def stage():
+        calls.append(1)
+        return write_stage(output, "x")()
+
+    manifest = {}
+    assert run_stage("stage", run_dir, manifest, {"d": 1}, [source], stage) == {"output": output}
+    run_stage("stage", run_dir, manifest, {"d": 1}, [source], stage)
+    assert len(calls) == 1
+    # the manifest is saved to disk after every stage
+    assert "stage" in load_stage_manifest(run_dir)
+
+    # new input content, new parameters and a missing output all run the stage again
+    with open(source, 'w') as f:
+        f.write("v2")
+    run_stage("stage", run_dir, manifest, {"d": 1}, [source], stage)
+    run_stage("stage", run_dir, manifest, {"d": 2}, [source], stage)
+    os.remove(output)
+    run_stage("stage", run_dir, manifest, {"d": 2}, [source], stage)
+    assert len(calls) == 4
+
+
+def test_failed_stage_is_not_recorded(tmp_path):
+    manifest = {}
+    assert run_stage("stage", str(tmp_path), manifest, {}, [], lambda: None) is None
+    assert "stage" not in manifest
+
+
+def test_latest_run_directory_of_the_mesh_only(tmp_path):
+    for name in ("bird_20240101_120000", "bird_20240102_120000", "bird_v2_20240103_120000", "bird_old"):
+        os.makedirs(tmp_path / name)
+        open(tmp_path / name / STAGE_MANIFEST, 'w').close()
+    latest = find_latest_run_directory("./input/bird/bird.off", str(tmp_path))
+    assert os.path.basename(latest) == "bird_20240102_120000"
+    assert find_latest_run_directory("./input/hand/hand.off", str(tmp_path)) is None
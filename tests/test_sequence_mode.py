@@ -0,0 +1,22 @@
+import numpy as np
+import trimesh
+
+from sequence_mode import sequence_coverage_axis
+
+
+def test_slow_drift_is_recomputed(sphere_mesh, ball_candidates):
+    # every frame moves less than the threshold, the whole sequence about 30 times more
+    move_threshold = 0.01
+    meshes = [trimesh.Trimesh(sphere_mesh.vertices * [1 + 0.005 * t, 1, 1 - 0.002 * t], sphere_mesh.faces,
+                              process=False) for t in range(60)]
+    dilation = 0.05
+    frames = sequence_coverage_axis(meshes, ball_candidates[:500], sample_number=400, dilation=dilation,
+                                    move_threshold=move_threshold, seed=0)
+
+    assert sum(frame["recomputed_columns"] for frame in frames[1:]) > 0
+    for frame in frames:
+        dist = np.linalg.norm(frame["samples"][:, None, :] - frame["centers"][None, :, :], axis=2)
+        covered = np.any(dist - frame["radius"][None, :] < dilation, axis=1)
+        assert frame["coverage"] == np.mean(covered)
+        assert np.isclose(frame["prefix_coverage"][-1], frame["coverage"])
+    assert frames[-1]["coverage"] > 0.99
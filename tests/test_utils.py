@@ -0,0 +1,30 @@
+import numpy as np
+import torch
+
+from utils import winding_number, winding_number_fused, winding_number_face_data
+
+
+def test_fused_winding_number_matches_the_original(sphere_mesh):
+    rng = np.random.default_rng(0)
+    points = rng.uniform(-1.5, 1.5, size=(2000, 3))
+    pts = torch.tensor(points).double()
+    verts = torch.tensor(np.array(sphere_mesh.vertices)).double()
+    faces = torch.tensor(np.array(sphere_mesh.faces)).long()
+    original = winding_number(pts, verts, faces).numpy()
+    fused = winding_number_fused(pts, verts, faces, point_block=256, face_block=64).numpy()
+    # the original kernel carries an eps bias of up to about 1e-2
+    assert np.max(np.abs(fused - original)) < 1e-2
+
+    r = np.linalg.norm(points, axis=1)
+    inside, outside = r < 0.9, r > 1.1
+    assert np.allclose(fused[inside], 1, atol=1e-9)
+    assert np.allclose(fused[outside], 0, atol=1e-9)
+
+
+def test_precomputed_face_data(sphere_mesh):
+    pts = torch.tensor(np.random.default_rng(1).normal(size=(100, 3))).double()
+    verts = torch.tensor(np.array(sphere_mesh.vertices)).double()
+    faces = torch.tensor(np.array(sphere_mesh.faces)).long()
+    face_data = winding_number_face_data(verts, faces)
+    assert torch.allclose(winding_number_fused(pts, verts, faces, face_data),
+                          winding_number_fused(pts, verts, faces))
@@ -1,4 +1,8 @@
+import os
+import heapq
+import numpy as np
 import trimesh
+from scipy.spatial import cKDTree
 
 def read_VD(path):
     points = []
@@ -21,6 +25,83 @@ def read_point(path):
     return points
 
 
+def sample_surface(mesh, count, method='random', seed=None):
+    """
+    Sample points on the surface of a mesh
+    method : 'random' (i.i.d. area weighted samples, trimesh.sample.sample_surface)
+             or 'blue_noise' (see sample_surface_blue_noise)
+    Returns (samples, face_index) as trimesh.sample.sample_surface
+    """
+    if method == 'blue_noise':
+        return sample_surface_blue_noise(mesh, count, seed=seed)
+    if method != 'random':
+        raise ValueError('Unknown surface sampling method: %s' % method)
+    if seed is None:
+        return trimesh.sample.sample_surface(mesh, count)
+    return trimesh.sample.sample_surface(mesh, count, seed=seed)
+
+
+def sample_surface_blue_noise(mesh, count, seed=None, oversample=5, alpha=8):
+    """
+    Blue-noise surface samples by weighted sample elimination (Yuksel 2015)
+    1. Draw oversample * count area weighted random samples on the surface
+    2. Weight every sample by its neighbors within 2 * r_max, w = (1 - d / (2 * r_max)) ** alpha
+    3. Repeatedly eliminate the sample of largest weight until count samples are left
+    The samples are well spread (no clusters, no holes), so fewer samples give the
+    same coverage fidelity as i.i.d. samples. Deterministic for a given seed.
+    Returns (samples, face_index) as trimesh.sample.sample_surface
+    """
+    rng = np.random.default_rng(seed)
+    vertices = np.asarray(mesh.vertices, dtype=np.float64)
+    faces = np.asarray(mesh.faces)
+    areas = np.asarray(mesh.area_faces, dtype=np.float64)
+    total_area = areas.sum()
+    n_candidates = max(int(count * oversample), count)
+
+    # area weighted candidates
+    face_index = np.searchsorted(np.cumsum(areas), rng.random(n_candidates) * total_area)
+    face_index = np.minimum(face_index, len(faces) - 1)
+    uv = rng.random((n_candidates, 2))
+    flip = uv.sum(axis=1) > 1
+    uv[flip] = 1 - uv[flip]
+    tri = vertices[faces[face_index]]
+    candidates = tri[:, 0] + uv[:, :1] * (tri[:, 1] - tri[:, 0]) + uv[:, 1:] * (tri[:, 2] - tri[:, 0])
+    if n_candidates == count:
+        return candidates, face_index
+
+    # maximal Poisson disk radius of count samples on a surface of this area
+    r_max = np.sqrt(total_area / (2 * np.sqrt(3) * count))
+    pairs = cKDTree(candidates).query_pairs(2 * r_max, output_type='ndarray')
+    dist = np.linalg.norm(candidates[pairs[:, 0]] - candidates[pairs[:, 1]], axis=1)
+    pair_weight = (1 - dist / (2 * r_max)) ** alpha
+
+    # symmetric neighbor lists in CSR layout
+    src = np.concatenate((pairs[:, 0], pairs[:, 1]))
+    dst = np.concatenate((pairs[:, 1], pairs[:, 0]))
+    w = np.concatenate((pair_weight, pair_weight))
+    order = np.argsort(src, kind='stable')
+    dst, w = dst[order], w[order]
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(src, minlength=n_candidates))))
+    weight = np.bincount(src, weights=np.concatenate((pair_weight, pair_weight)), minlength=n_candidates)
+
+    # eliminate the most crowded samples, with a lazy max-heap (ties broken by index)
+    heap = [(-weight[i], i) for i in range(n_candidates)]
+    heapq.heapify(heap)
+    alive = np.ones(n_candidates, dtype=bool)
+    remaining = n_candidates
+    while remaining > count:
+        neg_weight, i = heapq.heappop(heap)
+        if not alive[i] or -neg_weight != weight[i]:
+            continue
+        alive[i] = False
+        remaining -= 1
+        for j, w_ij in zip(dst[offsets[i]:offsets[i + 1]], w[offsets[i]:offsets[i + 1]]):
+            if alive[j]:
+                weight[j] -= w_ij
+                heapq.heappush(heap, (-weight[j], j))
+    return candidates[alive], face_index[alive]
+
+
 def save_obj(path, verts, faces=None):
     verts = verts.tolist()
 
@@ -130,12 +211,104 @@ def winding_number(pts: torch.Tensor, verts: torch.Tensor, faces: torch.Tensor)
     return winding
 
 
-def ball_vis(position, r):
-    for i in range(r.shape[0]):
-        mesh = trimesh.load('./assets/sphere_I.obj')
-        mesh.vertices = mesh.vertices * r[i]
-        mesh.vertices = mesh.vertices + position[i]
-        mesh.export('./vis_ball/%04d.obj'%i)
-
+def winding_number_face_data(verts: torch.Tensor, faces: torch.Tensor) -> dict:
+    """
+    Per-face data of winding_number_fused, computed once per mesh
+    With a = v0 - p, b = v1 - p, c = v2 - p, every quantity of the solid angle
+    expands into a dot product of p with a per-face vector plus a per-face scalar:
+    |a|^2 = |p|^2 - 2 p.v0 + |v0|^2, a.b = |p|^2 - p.(v0 + v1) + v0.v1, and
+    det[a, b, c] = det[v0, v1, v2] - p.((v1 - v0) x (v2 - v0)).
+    The mesh is centered first, which keeps the expansions well conditioned.
+    """
+    center = verts.mean(dim=0)
+    v = verts - center
+    v0, v1, v2 = v[faces[:, 0]], v[faces[:, 1]], v[faces[:, 2]]
+    normal = torch.linalg.cross(v1 - v0, v2 - v0)
+    vectors = torch.stack([v0, v1, v2, v0 + v1, v1 + v2, v2 + v0, normal], dim=0)  # 7, n_faces, 3
+    scalars = torch.stack([(v0 * v0).sum(-1), (v1 * v1).sum(-1), (v2 * v2).sum(-1),
+                           (v0 * v1).sum(-1), (v1 * v2).sum(-1), (v2 * v0).sum(-1),
+                           (v0 * torch.linalg.cross(v1, v2)).sum(-1)], dim=0)  # 7, n_faces
+    return {"center": center, "vectors": vectors, "scalars": scalars}
+
+
+def winding_number_fused(pts: torch.Tensor, verts: torch.Tensor, faces: torch.Tensor, face_data: dict = None,
+                         point_block: int = 1024, face_block: int = 2048) -> torch.Tensor:
+    """
+    Generalized Winding Number of points on the mesh, same result as winding_number
+    The solid angle of every triangle is the Van Oosterom-Strackee closed form
+    tan(omega / 2) = det[a, b, c] / (|a||b||c| + (a.b)|c| + (a.c)|b| + (b.c)|a|),
+    evaluated by blocks of point_block points x face_block faces with a single
+    matmul per block (see winding_number_face_data): memory is O(point_block *
+    face_block) whatever the number of points, and nothing is gathered per point.
+    Parameters
+    ----------
+    pts       : torch.Tensor, (n_points, 3), double precision recommended
+    verts     : torch.Tensor, (n_verts, 3)
+    faces     : torch.Tensor, (n_faces, 3)
+    face_data : winding_number_face_data(verts, faces), to reuse over many calls
+    """
+    if face_data is None:
+        face_data = winding_number_face_data(verts, faces)
+    vectors, scalars = face_data["vectors"], face_data["scalars"]
+    n_faces = vectors.shape[1]
+    p = pts - face_data["center"]
+    winding = torch.zeros(p.shape[0], dtype=p.dtype, device=p.device)
+    for ps in range(0, p.shape[0], point_block):
+        pb = p[ps:ps + point_block]
+        pp = (pb * pb).sum(-1, keepdim=True)  # nb, 1
+        for fs in range(0, n_faces, face_block):
+            vec = vectors[:, fs:fs + face_block]
+            s = scalars[:, fs:fs + face_block, None]
+            dots = (pb @ vec.reshape(-1, 3).T).view(pb.shape[0], 7, -1).transpose(0, 1)  # 7, nb, fb
+            la = (pp - 2 * dots[0]).add_(s[0].T).clamp_(min=0).sqrt_()
+            lb = (pp - 2 * dots[1]).add_(s[1].T).clamp_(min=0).sqrt_()
+            lc = (pp - 2 * dots[2]).add_(s[2].T).clamp_(min=0).sqrt_()
+            den = la * lb * lc
+            den.add_((pp - dots[3]).add_(s[3].T).mul_(lc))
+            den.add_((pp - dots[4]).add_(s[4].T).mul_(la))
+            den.add_((pp - dots[5]).add_(s[5].T).mul_(lb))
+            det = s[6].T - dots[6]
+            winding[ps:ps + point_block] += torch.atan2(det, den).sum(dim=-1)
+    return winding / (2 * torch.pi)
+
+
+def sphere_template(template='./assets/sphere_I.obj', subdivisions=None):
+    """
+    Unit sphere mesh instanced for every ball
+    subdivisions : if given, use an icosphere of this level of detail instead of the template file
+    """
+    if subdivisions is not None:
+        return trimesh.creation.icosphere(subdivisions=subdivisions, radius=1.0)
+    return trimesh.load(template, force='mesh')
 
 
+def ball_vis(position, r, path='./vis_ball/balls.obj', template='./assets/sphere_I.obj', subdivisions=None, group=True):
+    """
+    Export all balls as one merged mesh (.obj or .ply)
+    The template sphere is loaded once and instanced for every center and radius
+    with a single broadcasted transform.
+    position     : (n, 3) centers
+    r            : (n,) or (n, 1) radii
+    group        : write every ball as its own group ('g ball_%04d') in .obj files
+    """
+    sphere = sphere_template(template, subdivisions)
+    template_verts = np.asarray(sphere.vertices, dtype=np.float64)
+    template_faces = np.asarray(sphere.faces, dtype=np.int64)
+    position = np.asarray(position, dtype=np.float64).reshape(-1, 3)
+    r = np.asarray(r, dtype=np.float64).reshape(-1)
+
+    verts = template_verts[None, :, :] * r[:, None, None] + position[:, None, :]  # n, V, 3
+    faces = template_faces[None, :, :] + (np.arange(len(r)) * len(template_verts))[:, None, None]  # n, F, 3
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    if not path.endswith('.obj'):
+        trimesh.Trimesh(vertices=verts.reshape(-1, 3), faces=faces.reshape(-1, 3), process=False).export(path)
+        return
+    with open(path, 'w') as f:
+        np.savetxt(f, verts.reshape(-1, 3), fmt='v %f %f %f')
+        if group:
+            for i in range(len(r)):
+                f.write('g ball_%04d\n' % i)
+                np.savetxt(f, faces[i] + 1, fmt='f %d %d %d')
+        else:
+            np.savetxt(f, faces.reshape(-1, 3) + 1, fmt='f %d %d %d')